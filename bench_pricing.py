@@ -0,0 +1,227 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Volume products as (volumeApiName, volumeType, productFamily, unit)
+EBS_PRODUCTS = [
+    ('gp2', 'General Purpose', 'Storage', 'GB-Mo'),
+    ('gp3', 'General Purpose', 'Storage', 'GB-Mo'),
+    ('io1', 'Provisioned IOPS', 'Storage', 'GB-Mo'),
+    ('io1', 'Provisioned IOPS', 'System Operation', 'IOPS-Mo'),
+    ('io2', 'Provisioned IOPS', 'Storage', 'GB-Mo'),
+    ('st1', 'Throughput Optimized HDD', 'Storage', 'GB-Mo'),
+    ('sc1', 'Cold HDD', 'Storage', 'GB-Mo'),
+    ('standard', 'Magnetic', 'Storage', 'GB-Mo'),
+]
+LOCATIONS = {
+    'us-gov-west-1': 'AWS GovCloud (US-West)',
+    'us-gov-east-1': 'AWS GovCloud (US-East)',
+    'us-east-1': 'US East (N. Virginia)',
+}
+BENCH_REGION = 'us-gov-west-1'
+
+
+def synthetic_product(i, region, rng, ebs_ratio):
+    """
+    Return (product, OnDemand term) for product number i. About ebs_ratio of the
+    products are EBS volumes, the rest are compute instances like in a real offer file.
+    """
+    sku = f"SKU{i:09d}"
+    if rng.random() < ebs_ratio:
+        volume_api_name, volume_type, product_family, unit = rng.choice(EBS_PRODUCTS)
+        attributes = {'location': LOCATIONS[region], 'regionCode': region, 'volumeApiName': volume_api_name,
+                      'volumeType': volume_type, 'storageMedia': 'SSD-backed'}
+    else:
+        product_family, unit = 'Compute Instance', 'Hrs'
+        attributes = {'location': LOCATIONS[region], 'regionCode': region, 'instanceType': f"m5.{i % 24}xlarge",
+                      'operatingSystem': 'Linux', 'tenancy': 'Shared', 'vcpu': str(i % 96 + 1)}
+    product = {'sku': sku, 'productFamily': product_family, 'attributes': attributes}
+    term = {f"{sku}.JRTCKXETXF": {
+        'offerTermCode': 'JRTCKXETXF', 'sku': sku, 'effectiveDate': '2026-10-01T00:00:00Z',
+        'priceDimensions': {f"{sku}.JRTCKXETXF.6YS6EN2CT7": {
+            'unit': unit, 'description': 'synthetic', 'pricePerUnit': {'USD': f"{rng.uniform(0.01, 1):.10f}"}
+        }}
+    }}
+    return product, term
+
+
+def write_offer_file(path, products, region=BENCH_REGION, ebs_ratio=0.01, seed=42):
+    """
+    Write a synthetic AmazonEC2 offer file (index.json layout) without holding it in memory.
+    """
+    rng = random.Random(seed)
+    terms_path = f"{path}.terms"
+    with open(path, 'w') as f, open(terms_path, 'w+') as terms:
+        f.write('{"formatVersion":"v1.0","offerCode":"AmazonEC2","version":"20261001000000",'
+                '"publicationDate":"2026-10-01T00:00:00Z","products":{')
+        for i in range(products):
+            product, term = synthetic_product(i, region, rng, ebs_ratio)
+            separator = ',' if i else ''
+            f.write(f'{separator}"{product["sku"]}":{json.dumps(product)}')
+            terms.write(f'{separator}"{product["sku"]}":{json.dumps(term)}')
+        f.write('},"terms":{"OnDemand":{')
+        terms.seek(0)
+        for chunk in iter(lambda: terms.read(1 << 20), ''):
+            f.write(chunk)
+        f.write('},"Reserved":{}}}')
+    os.remove(terms_path)
+
+
+def synthetic_price_list(products, ebs_ratio=0.01, seed=42):
+    """
+    Return a get_products style PriceList (JSON strings) spread over all LOCATIONS.
+    """
+    rng = random.Random(seed)
+    price_list = []
+    regions = list(LOCATIONS)
+    for i in range(products):
+        product, term = synthetic_product(i, regions[i % len(regions)], rng, ebs_ratio)
+        price_list.append(json.dumps({'product': product, 'terms': {'OnDemand': term},
+                                      'version': '20261001000000', 'publicationDate': '2026-10-01T00:00:00Z'}))
+    return price_list
+
+
+def measure(run):
+    """
+    Run once for wall time, then again under tracemalloc for peak memory.
+    """
+    start = time.perf_counter()
+    result = run()
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, seconds, peak / (1024 * 1024)
+
+
+def bench_offer_paths(products, lookups, workdir):
+    """
+    Offer-file paths: streaming parse (get_volume_price, get_aws_pricing) and warm get_volume_price lookups.
+    """
+    import pricing_cache
+    from offer_stream import load_offer_slice
+    from pub_price import extract_volume_prices
+
+    path = os.path.join(workdir, f"offer-{products}.json")
+    write_offer_file(path, products)
+    results = []
+
+    def parse_ebs():
+        with open(path, 'rb') as f:
+            return load_offer_slice(f)
+    data, seconds, peak = measure(parse_ebs)
+    results.append({'path': 'get_volume_price.parse', 'products': products, 'seconds': seconds, 'peak_mb': peak,
+                    'items_per_second': products / seconds})
+
+    def parse_storage():
+        with open(path, 'rb') as f:
+            storage = load_offer_slice(f, keep_product=lambda product: product.get('productFamily') == 'Storage')
+        return extract_volume_prices(storage)
+    _, seconds, peak = measure(parse_storage)
+    results.append({'path': 'get_aws_pricing', 'products': products, 'seconds': seconds, 'peak_mb': peak,
+                    'items_per_second': products / seconds})
+
+    # Warm lookups: seed the pricing cache with the parsed slice, then time get_volume_price itself
+    pricing_cache.PRICING_CACHE_DIR = os.path.join(workdir, 'cache')
+    pricing_cache.write_entry(pricing_cache.cache_key('AmazonEC2', BENCH_REGION, 'ebs'), data)
+    import pricecheck_govcloud
+    volume_types = ['gp2', 'gp3', 'Provisioned IOPS', 'st1', 'sc1']
+    pricecheck_govcloud.get_volume_price(BENCH_REGION, 'gp2')  # builds the region's price index once
+    start = time.perf_counter()
+    for i in range(lookups):
+        pricecheck_govcloud.get_volume_price(BENCH_REGION, volume_types[i % len(volume_types)])
+    seconds = time.perf_counter() - start
+    results.append({'path': 'get_volume_price.lookup', 'products': products, 'seconds': seconds,
+                    'lookups_per_second': lookups / seconds})
+    os.remove(path)
+    return results
+
+
+def bench_price_list_paths(products, lookups):
+    """
+    Pricing API paths: get_govcloud_pricing_info (price index build + lookups) and print_govcloud_pricing_info.
+    """
+    from price_index import lookup_price
+    from pricecheck_dyno import get_govcloud_pricing_info
+    from pricecheck_govcloud import print_govcloud_pricing_info
+
+    price_list = synthetic_price_list(products)
+    results = []
+
+    index, seconds, peak = measure(lambda: get_govcloud_pricing_info(price_list))
+    results.append({'path': 'get_govcloud_pricing_info', 'products': products, 'seconds': seconds, 'peak_mb': peak,
+                    'items_per_second': products / seconds})
+
+    start = time.perf_counter()
+    for i in range(lookups):
+        lookup_price(index, BENCH_REGION, 'gp2')
+    seconds = time.perf_counter() - start
+    results.append({'path': 'get_govcloud_pricing_info.lookup', 'products': products, 'seconds': seconds,
+                    'lookups_per_second': lookups / seconds})
+
+    def print_info():
+        with contextlib.redirect_stdout(io.StringIO()):
+            print_govcloud_pricing_info(json.loads(item) for item in price_list)
+    _, seconds, peak = measure(print_info)
+    results.append({'path': 'print_govcloud_pricing_info', 'products': products, 'seconds': seconds, 'peak_mb': peak,
+                    'items_per_second': products / seconds})
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Return the results that are slower than the baseline by more than tolerance (e.g. 0.25 = 25%).
+    """
+    previous = {(item['path'], item['products']): item for item in baseline['results']}
+    regressions = []
+    for item in results:
+        old = previous.get((item['path'], item['products']))
+        if old is not None and item['seconds'] > old['seconds'] * (1 + tolerance):
+            regressions.append((item, old))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline micro-benchmarks for the pricing parse and lookup paths.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000],
+                        help="catalog sizes in products (10k to 1M)")
+    parser.add_argument('--lookups', type=int, default=100000, help="lookups per lookup benchmark")
+    parser.add_argument('--output', default='bench_results.json', help="where to write the results")
+    parser.add_argument('--baseline', help="baseline results to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed slowdown against the baseline")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in args.sizes:
+            results.extend(bench_offer_paths(size, args.lookups, workdir))
+            results.extend(bench_price_list_paths(size, args.lookups))
+
+    for item in results:
+        rate = item.get('lookups_per_second') or item.get('items_per_second')
+        peak = f"{item['peak_mb']:.1f} MB peak" if 'peak_mb' in item else ''
+        print(f"{item['path']:<35} {item['products']:>9} products {item['seconds']:>8.3f}s {rate:>14,.0f}/s {peak}")
+
+    with open(args.output, 'w') as f:
+        json.dump({'python': sys.version.split()[0], 'created_at': int(time.time()), 'results': results}, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for item, old in regressions:
+            print(f"REGRESSION {item['path']} ({item['products']} products): {old['seconds']:.3f}s -> {item['seconds']:.3f}s")
+        if regressions:
+            exit(1)
+
+
+if __name__ == "__main__":
+    main()
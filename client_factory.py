@@ -0,0 +1,157 @@
+import hashlib
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import boto3
+from botocore.config import Config
+
+from rate_limiter import RETRY_CONFIG, rate_limit_client
+from run_metrics import instrument_client
+
+# botocore's default pool; clients for threaded callers get one connection per worker
+MAX_POOL_CONNECTIONS = int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', 10))
+# How long a successful STS check of credentials without an Expiration is trusted
+CREDENTIAL_VALIDATION_TTL = int(os.environ.get('CREDENTIAL_VALIDATION_TTL', 60 * 60))  # seconds
+
+_lock = threading.RLock()
+_sessions = {}
+_clients = {}  # key -> (client, pool size)
+_validated = {}  # credentials key -> (identity, valid until)
+_expirations = {}  # credentials key -> expiration timestamp of temporary credentials
+_resources = threading.local()  # boto3 resources are not thread-safe, so they are cached per thread
+
+
+def partition_for_region(region):
+    if region and region.startswith('us-gov-'):
+        return 'aws-us-gov'
+    return 'aws'
+
+
+def _credentials_key(credentials):
+    # Identify credentials without keeping the secret in cache keys or logs
+    if not credentials:
+        return None
+    secret = f"{credentials['SecretAccessKey']}:{credentials.get('SessionToken')}"
+    return credentials['AccessKeyId'], hashlib.sha256(secret.encode()).hexdigest()[:16]
+
+
+def _expiration(credentials):
+    expiration = (credentials or {}).get('Expiration')
+    if isinstance(expiration, datetime):
+        return expiration.astimezone(timezone.utc).timestamp()
+    return None
+
+
+def _prune_expired():
+    # Drop sessions and clients of expired assumed-role credentials (called under _lock),
+    # so long-lived containers do not keep one per credential refresh
+    now = time.time()
+    expired = {key for key, expiration in _expirations.items() if expiration <= now}
+    if not expired:
+        return
+    for cache in (_sessions, _clients, _validated):
+        for key in [key for key in cache if key[-1] in expired]:
+            del cache[key]
+    for key in expired:
+        del _expirations[key]
+
+
+def get_session(region=None, credentials=None):
+    """
+    Return the boto3 session for (partition, region, credentials), created once per process.
+
+    :param credentials: STS-style dict with AccessKeyId, SecretAccessKey and optional
+                        SessionToken / Expiration; None uses the default credential chain
+    """
+    key = (partition_for_region(region), region, _credentials_key(credentials))
+    session = _sessions.get(key)
+    if session is None:
+        with _lock:
+            session = _sessions.get(key)
+            if session is None:
+                _prune_expired()
+                if credentials:
+                    session = boto3.Session(
+                        aws_access_key_id=credentials['AccessKeyId'],
+                        aws_secret_access_key=credentials['SecretAccessKey'],
+                        aws_session_token=credentials.get('SessionToken'),
+                        region_name=region
+                    )
+                else:
+                    session = boto3.Session(region_name=region)
+                if _expiration(credentials) is not None:
+                    _expirations[key[-1]] = _expiration(credentials)
+                _sessions[key] = session
+    return session
+
+
+def get_client(service, region=None, credentials=None, max_workers=None):
+    """
+    Return a shared, rate-limited and instrumented client for
+    (partition, region, service, credentials). Clients are thread-safe and reused by
+    every caller, so connections and TLS sessions are set up once.
+
+    :param max_workers: number of threads that will use the client concurrently;
+                        the connection pool is grown to at least this size
+    """
+    pool = max(MAX_POOL_CONNECTIONS, max_workers or 0)
+    key = (partition_for_region(region), region, service, _credentials_key(credentials))  # credentials key last
+    cached = _clients.get(key)
+    if cached is None or cached[1] < pool:
+        with _lock:
+            cached = _clients.get(key)
+            if cached is None or cached[1] < pool:
+                # Session.client is not thread-safe, so clients are built under the lock
+                config = RETRY_CONFIG.merge(Config(max_pool_connections=pool))
+                client = get_session(region, credentials).client(service, region_name=region, config=config)
+                cached = (rate_limit_client(instrument_client(client)), pool)
+                _clients[key] = cached
+    return cached[0]
+
+
+def get_resource(service, region=None, credentials=None):
+    """
+    Return a boto3 resource (e.g. dynamodb) for the calling thread, built from the
+    shared session with the same pooled, rate-limited client configuration.
+
+    The resource keeps its own client: resources register their high-level
+    (de)serialisation handlers on it, which would break low-level callers of get_client.
+    """
+    key = (partition_for_region(region), region, service, _credentials_key(credentials))
+    resources = getattr(_resources, 'cache', None)
+    if resources is None:
+        resources = _resources.cache = {}
+    resource = resources.get(key)
+    if resource is None:
+        config = RETRY_CONFIG.merge(Config(max_pool_connections=MAX_POOL_CONNECTIONS))
+        with _lock:
+            resource = get_session(region, credentials).resource(service, region_name=region, config=config)
+        rate_limit_client(instrument_client(resource.meta.client))
+        resources[key] = resource
+    return resource
+
+
+def validate_credentials(credentials=None, region=None):
+    """
+    Check credentials with STS GetCallerIdentity once and trust the result until
+    they expire (or for CREDENTIAL_VALIDATION_TTL seconds without an Expiration).
+
+    :return: caller identity dict, or None if the credentials are invalid
+    """
+    key = (partition_for_region(region), _credentials_key(credentials))
+    cached = _validated.get(key)
+    if cached is not None and cached[1] > time.time():
+        return cached[0]
+    try:
+        identity = get_client('sts', region, credentials).get_caller_identity()
+    except Exception as e:
+        print(f"Error validating session token: {str(e)}")
+        return None
+    valid_until = time.time() + CREDENTIAL_VALIDATION_TTL
+    if _expiration(credentials) is not None:
+        valid_until = min(valid_until, _expiration(credentials))
+    _validated[key] = (identity, valid_until)
+    print(f"Token is valid. Account: {identity['Account']}, ARN: {identity['Arn']}")
+    return identity
@@ -0,0 +1,169 @@
+import math
+
+import numpy as np
+
+# Price dimensions of an EBS volume: (column, Pricing API unit, Pricing API productFamily)
+DIMENSIONS = (
+    ('storage', 'GB-Mo', 'Storage'),
+    ('iops', 'IOPS-Mo', 'System Operation'),
+    ('throughput', 'GiBps-mo', 'Provisioned Throughput'),
+)
+
+# Provisioned IOPS and throughput included in the storage price, per volume type
+FREE_IOPS = {'gp3': 3000}
+FREE_THROUGHPUT = {'gp3': 125}  # MiB/s
+# Volume types billed for provisioned IOPS / throughput; other types ignore those columns
+IOPS_BILLED = ('gp3', 'io1', 'io2')
+THROUGHPUT_BILLED = ('gp3',)
+# Tiered IOPS pricing: (up to IOPS, fraction of the first tier price); None means no upper bound
+IOPS_TIERS = {'io2': ((32000, 1.0), (64000, 0.7), (None, 0.49))}
+
+# Positions in the process_volumes rows:
+# [name, id, account, region, size, type, create_time, target_date, excluded, (iops), (throughput)]
+INVENTORY_COLUMNS = {'region': 3, 'size': 4, 'volume_type': 5, 'iops': 9, 'throughput': 10}
+
+# One compact record per volume; region and volume type are codes into the name lists
+VOLUME_DTYPE = np.dtype([
+    ('region', np.uint16),
+    ('volume_type', np.uint8),
+    ('size', np.uint32),
+    ('iops', np.uint32),
+    ('throughput', np.uint32),
+])
+
+
+def _charged_iops(volume_type, iops):
+    return max(iops - FREE_IOPS.get(volume_type, 0), 0) if volume_type in IOPS_BILLED else 0
+
+
+def volume_monthly_cost(price_of, region, volume_type, size, iops=0, throughput=0):
+    """
+    Monthly cost of one volume: storage, plus provisioned IOPS and throughput above
+    the free allowance of its type. This is the scalar reference for monthly_costs.
+
+    :param price_of: callable(region, volume_type, unit) -> price or None, e.g.
+                     functools.partial(price_index.lookup_price, index)
+    :return: cost in USD, or None when the storage price is unknown
+    """
+    storage_price = price_of(region, volume_type, 'GB-Mo')
+    if storage_price is None:
+        return None
+    cost = size * storage_price
+
+    charged_iops = _charged_iops(volume_type, iops)
+    if charged_iops:
+        iops_price = price_of(region, volume_type, 'IOPS-Mo') or 0.0
+        lower = 0
+        for upper, fraction in IOPS_TIERS.get(volume_type, ((None, 1.0),)):
+            in_tier = charged_iops - lower if upper is None else min(charged_iops, upper) - lower
+            if in_tier <= 0:
+                break
+            cost += in_tier * iops_price * fraction
+            lower = upper
+
+    if volume_type in THROUGHPUT_BILLED:
+        charged_throughput = max(throughput - FREE_THROUGHPUT.get(volume_type, 0), 0)
+        if charged_throughput:
+            # Throughput is priced per GiB/s-month and provisioned in MiB/s
+            cost += charged_throughput / 1024 * (price_of(region, volume_type, 'GiBps-mo') or 0.0)
+    return cost
+
+
+def load_inventory(rows, columns=INVENTORY_COLUMNS):
+    """
+    Load volume rows into a structured array of compact records.
+
+    :param rows: iterable of process_volumes rows (lists); missing IOPS/throughput columns count as 0
+    :param columns: positions of the region, size, volume_type, iops and throughput columns
+    :return: (records, region names, volume type names); records['region'] indexes region names
+    """
+    regions, volume_types = {}, {}
+    region_codes, type_codes, sizes, iops, throughput = [], [], [], [], []
+    iops_column, throughput_column = columns['iops'], columns['throughput']
+    for row in rows:
+        region_codes.append(regions.setdefault(row[columns['region']], len(regions)))
+        type_codes.append(volume_types.setdefault(row[columns['volume_type']], len(volume_types)))
+        sizes.append(int(row[columns['size']]))
+        iops.append(int(row[iops_column] or 0) if len(row) > iops_column else 0)
+        throughput.append(int(row[throughput_column] or 0) if len(row) > throughput_column else 0)
+
+    records = np.empty(len(sizes), dtype=VOLUME_DTYPE)
+    records['region'] = region_codes
+    records['volume_type'] = type_codes
+    records['size'] = sizes
+    records['iops'] = iops
+    records['throughput'] = throughput
+    return records, list(regions), list(volume_types)
+
+
+def build_price_table(region_names, type_names, price_of):
+    """
+    Resolve every price once per (region, volume type) into arrays of shape
+    (regions, volume types), one per dimension. Unknown prices are NaN.
+
+    :return: dict {'storage': array, 'iops': array, 'throughput': array}
+    """
+    billed = {'storage': None, 'iops': IOPS_BILLED, 'throughput': THROUGHPUT_BILLED}
+    table = {}
+    for column, unit, _ in DIMENSIONS:
+        prices = np.full((len(region_names), len(type_names)), np.nan)
+        for r, region in enumerate(region_names):
+            for t, volume_type in enumerate(type_names):
+                # Only look up IOPS and throughput prices of types that are billed for them
+                if billed[column] is not None and volume_type not in billed[column]:
+                    continue
+                price = price_of(region, volume_type, unit)
+                if price is not None:
+                    prices[r, t] = price
+        table[column] = prices
+    return table
+
+
+def monthly_costs(records, type_names, price_table):
+    """
+    Monthly cost of every volume in one vectorized pass over the records.
+    Matches volume_monthly_cost row by row; volumes without a storage price are NaN.
+
+    :param records: structured array from load_inventory
+    :param type_names: volume type names from load_inventory
+    :param price_table: arrays from build_price_table
+    :return: float64 array of monthly costs
+    """
+    region, volume_type = records['region'], records['volume_type']
+    cost = records['size'] * price_table['storage'][region, volume_type]
+
+    # Per-type allowances and flags, gathered to one value per volume
+    free_iops = np.array([FREE_IOPS.get(name, 0) for name in type_names], dtype=np.float64)
+    free_throughput = np.array([FREE_THROUGHPUT.get(name, 0) for name in type_names], dtype=np.float64)
+    iops_billed = np.array([name in IOPS_BILLED for name in type_names], dtype=bool)
+    throughput_billed = np.array([name in THROUGHPUT_BILLED for name in type_names], dtype=bool)
+
+    charged_iops = np.where(iops_billed[volume_type],
+                            np.maximum(records['iops'] - free_iops[volume_type], 0), 0)
+    iops_price = np.nan_to_num(price_table['iops'][region, volume_type])
+    iops_cost = charged_iops * iops_price
+    for name, tiers in IOPS_TIERS.items():
+        if name not in type_names:
+            continue
+        # IOPS falling in each tier's band, weighted by the tier's price fraction
+        mask = volume_type == type_names.index(name)
+        tier_iops, lower = np.zeros(int(mask.sum())), 0
+        for upper, fraction in tiers:
+            upper = math.inf if upper is None else upper
+            tier_iops += (np.clip(charged_iops[mask], lower, upper) - lower) * fraction
+            lower = upper
+        iops_cost[mask] = tier_iops * iops_price[mask]
+
+    charged_throughput = np.where(throughput_billed[volume_type],
+                                  np.maximum(records['throughput'] - free_throughput[volume_type], 0), 0)
+    throughput_cost = charged_throughput / 1024 * np.nan_to_num(price_table['throughput'][region, volume_type])
+    return cost + iops_cost + throughput_cost
+
+
+def inventory_monthly_costs(rows, price_of, columns=INVENTORY_COLUMNS):
+    """
+    Load rows and return the monthly cost of every volume, in row order.
+    Each price is resolved once per (region, volume type) with price_of.
+    """
+    records, region_names, type_names = load_inventory(rows, columns)
+    return monthly_costs(records, type_names, build_price_table(region_names, type_names, price_of))
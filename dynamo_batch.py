@@ -0,0 +1,143 @@
+import concurrent.futures
+import random
+import time
+
+from run_metrics import phase
+
+# BatchWriteItem accepts at most 25 put/delete requests per call
+BATCH_WRITE_LIMIT = 25
+# BatchGetItem accepts at most 100 keys per call
+BATCH_GET_LIMIT = 100
+# Key of the VolumePricing and cost savings tables
+KEY_ATTRIBUTES = ('VolumeId', 'AccountId')
+
+
+def chunk_items(items, size=BATCH_WRITE_LIMIT):
+    """
+    Yield lists of up to size items from any iterable, without materialising it.
+    """
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def item_key(item, key_attributes=KEY_ATTRIBUTES):
+    return tuple(tuple(item[name].items()) for name in key_attributes)
+
+
+def unique_items(items, key_attributes=KEY_ATTRIBUTES):
+    """
+    Drop all but the last item per key: BatchWriteItem rejects a request that
+    writes the same key twice.
+
+    :param key_attributes: the table's key attribute names
+    """
+    unique = {item_key(item, key_attributes): item for item in items}
+    return list(unique.values())
+
+
+def write_batch(dynamo_client, table_name, items, max_retries=8, base_delay=0.05, key_attributes=KEY_ATTRIBUTES):
+    """
+    Write up to 25 items with BatchWriteItem, retrying UnprocessedItems with
+    exponential backoff and jitter. Items sharing a key are written once, with the
+    last of them; the others share its outcome, since they are superseded by it.
+
+    :param key_attributes: the table's key attribute names; None skips de-duplication
+    :return: list of the items that could not be written after max_retries
+    """
+    unique = unique_items(items, key_attributes) if key_attributes else items
+    request_items = {table_name: [{'PutRequest': {'Item': item}} for item in unique]}
+    for attempt in range(max_retries + 1):
+        with phase('dynamodb_write'):
+            response = dynamo_client.batch_write_item(RequestItems=request_items)
+        request_items = response.get('UnprocessedItems') or {}
+        if not request_items:
+            return []
+        if attempt < max_retries:
+            time.sleep(random.uniform(0, base_delay * (2 ** attempt)))
+    unprocessed = [request['PutRequest']['Item'] for request in request_items.get(table_name, [])]
+    if len(unique) < len(items):
+        failed_keys = {item_key(item, key_attributes) for item in unprocessed}
+        unprocessed = [item for item in items if item_key(item, key_attributes) in failed_keys]
+    print(f"Giving up on {len(unprocessed)} unprocessed items for table {table_name}")
+    return unprocessed
+
+
+def batch_write_items(dynamo_client, table_name, items, max_workers=4, max_retries=8, on_written=None,
+                      key_attributes=KEY_ATTRIBUTES, on_failed=None):
+    """
+    Upload items (low-level client format) in 25-item BatchWriteItem requests,
+    running up to max_workers batches at once.
+
+    :param dynamo_client: boto3 DynamoDB client
+    :param table_name: target table
+    :param items: iterable of items, e.g. {'VolumeId': {'S': ...}, ...}
+    :param max_workers: number of concurrent BatchWriteItem calls
+    :param max_retries: retries for UnprocessedItems per batch
+    :param on_written: optional callable(items) called with the items of each batch that
+                       were written, always from the calling thread
+    :param key_attributes: the table's key attribute names, used to drop duplicate keys
+                           within a batch (see write_batch); None sends items as they are
+    :param on_failed: optional callable(items) called with the items of each batch that
+                      stayed unprocessed after max_retries, always from the calling thread
+    :return: dict with items written, unprocessed items, elapsed seconds and items per second
+    """
+    start = time.perf_counter()
+    written = 0
+    unprocessed = 0
+
+    def finish(future, chunk):
+        nonlocal written, unprocessed
+        failed = future.result()
+        written += len(chunk) - len(failed)
+        unprocessed += len(failed)
+        if on_written is not None:
+            on_written([item for item in chunk if item not in failed] if failed else chunk)
+        if failed and on_failed is not None:
+            on_failed([item for item in chunk if item in failed])
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        in_flight = {}
+        for chunk in chunk_items(items):
+            # Keep a bounded number of batches in flight so a large generator is never buffered
+            if len(in_flight) >= max_workers * 2:
+                done, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    finish(future, in_flight.pop(future))
+            future = executor.submit(write_batch, dynamo_client, table_name, chunk, max_retries,
+                                     key_attributes=key_attributes)
+            in_flight[future] = chunk
+        for future in concurrent.futures.as_completed(in_flight):
+            finish(future, in_flight[future])
+
+    seconds = time.perf_counter() - start
+    items_per_second = written / seconds if seconds > 0 else 0.0
+    return {'written': written, 'unprocessed': unprocessed, 'seconds': seconds, 'items_per_second': items_per_second}
+
+
+def batch_get_items(dynamo_client, table_name, keys, attributes=None):
+    """
+    Read items by key with BatchGetItem, 100 keys per call, retrying UnprocessedKeys.
+
+    :param keys: key dicts in low-level format, e.g. {'VolumeId': {'S': ...}, 'AccountId': {'S': ...}}
+    :param attributes: optional attribute names to return (the key attributes are always needed)
+    :return: list of the items found, in no particular order
+    """
+    found = []
+    for start in range(0, len(keys), BATCH_GET_LIMIT):
+        request = {'Keys': keys[start:start + BATCH_GET_LIMIT]}
+        if attributes:
+            names = {f"#a{i}": name for i, name in enumerate(attributes)}
+            request['ProjectionExpression'] = ', '.join(names)
+            request['ExpressionAttributeNames'] = names
+        request_items = {table_name: request}
+        while request_items:
+            response = dynamo_client.batch_get_item(RequestItems=request_items)
+            found.extend(response.get('Responses', {}).get(table_name, []))
+            request_items = response.get('UnprocessedKeys') or {}
+    return found
@@ -0,0 +1,39 @@
+import codecs
+import csv
+
+# Header of the orphaned_volumes CSV report written by the Lambda
+REPORT_COLUMNS = ["Volume Name", "Volume ID", "Account", "Region", "Size", "Type", "Creation Time",
+                  "Target Termination Date", "Excluded"]
+
+
+def open_report(location, s3_client=None):
+    """
+    Open an orphaned_volumes report for streaming, from local disk or from S3.
+
+    :param location: file path or s3://bucket/key URL
+    :param s3_client: boto3 S3 client, created on demand for s3:// locations
+    :return: text stream; S3 objects are read from the response body as they are consumed
+    """
+    if not location.startswith('s3://'):
+        return open(location, newline='', encoding='utf-8')
+    if s3_client is None:
+        from client_factory import get_client
+        s3_client = get_client('s3')
+    bucket, _, key = location[len('s3://'):].partition('/')
+    body = s3_client.get_object(Bucket=bucket, Key=key)['Body']
+    return codecs.getreader('utf-8')(body)
+
+
+def iter_report_rows(location, s3_client=None):
+    """
+    Yield the volume rows of an orphaned_volumes report one at a time, in the
+    process_volumes row layout. Only the current row is held in memory.
+    """
+    report = open_report(location, s3_client)
+    try:
+        for row in csv.reader(report):
+            if not row or row[:2] == REPORT_COLUMNS[:2]:
+                continue  # header or blank line
+            yield row
+    finally:
+        report.close()
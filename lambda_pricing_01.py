@@ -1,58 +1,243 @@
-import json
-from botocore.exceptions import ClientError
-from genericpath import exists
-from tarfile import TarFile 
-import time
-from datetime import datetime, date, timedelta
+from datetime import datetime, date, timedelta, timezone
 import os
-import csv
-from unittest import result
-import boto3
 import logging
-import concurrent.futures
+import threading
+from pricing_cache import cache_key, get_or_load
+from price_index import is_upper_iops_tier
+from pricing_api import iter_products, pricing_filters, prefetch_pages
+from run_metrics import emit_metrics, instrument_client, phase
+from rate_limiter import rate_limit_client
+import client_factory
+from client_factory import partition_for_region
+from profiling import profiled
+# csv, concurrent.futures, dynamo_batch, cost_engine and savings_rollups are imported where they are first used
 
 current_date = date.today()
 
 ## define logging values
 handler = logging.StreamHandler()
-formatter = logging.Formatter('%(names)s - %(message)s')
+formatter = logging.Formatter('%(name)s - %(message)s')
 logger = logging.getLogger(os.environ['function_name'])
 handler.setFormatter(formatter)
-logger.addHandle(handler)
+logger.addHandler(handler)
 logger.setLevel(logging.INFO)
 
 # ------ Global -----#
 #vars go here
+MAX_SCAN_WORKERS = int(os.environ.get('MAX_SCAN_WORKERS', 32))
+PER_ACCOUNT_SCAN_LIMIT = int(os.environ.get('PER_ACCOUNT_SCAN_LIMIT', 4))
+# CostSavings keeps the scale of the original per-volume formula (size * price * 30), which
+# existing rows, rollups and dashboards use; changing it needs a migration of the stored values
+COST_SAVINGS_FACTOR = 30
+
+# Tables known to exist for the lifetime of this container, per (endpoint, region, client, table)
+_known_tables = set()
+
+# Assumed-role credentials per (account, partition, role), reused across regions and warm invocations
+_account_credentials = {}
+_account_locks = {}
+_account_locks_lock = threading.Lock()
 
 
 def lambda_handler(event, context):
    #  stuff here. 
+   pass
 
 # ----------------------------------------
 
 def process_volumes(account, cloud_regions, context, target_role, data):
     """
        Some text here leaving out for now.
+       Use get_account_client(account, target_role, region, 'ec2') for a shared client on cached assumed-role credentials.
+    """
+
+
+def get_client(service, region_name=None):
+    """
+    Return the shared client for service/region (see client_factory.get_client), created
+    once per container with a connection pool sized for MAX_SCAN_WORKERS threads.
+    """
+    return client_factory.get_client(service, region_name, max_workers=MAX_SCAN_WORKERS)
+
+
+def get_account_credentials(account, target_role, region):
+    """
+    Assume target_role in account once per partition and cache the credentials
+    until five minutes before they expire. Concurrent callers for the same
+    account wait for a single AssumeRole call.
     """
+    partition = partition_for_region(region)
+    key = (account, partition, target_role)
+    credentials = _account_credentials.get(key)
+    if credentials and credentials['Expiration'] - timedelta(minutes=5) > datetime.now(timezone.utc):
+        return credentials
+
+    with _account_locks_lock:
+        lock = _account_locks.setdefault(key, threading.Lock())
+    with lock:
+        credentials = _account_credentials.get(key)
+        if not credentials or credentials['Expiration'] - timedelta(minutes=5) <= datetime.now(timezone.utc):
+            sts_client = get_client('sts', region)
+            response = sts_client.assume_role(
+                RoleArn=f"arn:{partition}:iam::{account}:role/{target_role}",
+                RoleSessionName=f"volume-scan-{account}"
+            )
+            credentials = response['Credentials']
+            _account_credentials[key] = credentials
+    return credentials
+
 
+def get_account_session(account, target_role, region):
+    credentials = get_account_credentials(account, target_role, region)
+    return client_factory.get_session(region, credentials)
+
+
+def get_account_client(account, target_role, region, service):
+    """
+    Return the shared client of service in account/region on the cached assumed-role
+    credentials, pooled for the PER_ACCOUNT_SCAN_LIMIT threads scanning that account.
+    """
+    credentials = get_account_credentials(account, target_role, region)
+    return client_factory.get_client(service, region, credentials, max_workers=PER_ACCOUNT_SCAN_LIMIT)
 
-def get_volume_price(pricing_client, volume_type, region):
-    filters = [
-        {'Type': 'TERM_MATCH', 'Field': 'volumeApiName', 'Value': volume_type},
-        {'Type': 'TERM_MATCH', 'Field': 'productFamily', 'Value': 'Storage'},
-        {'Type': 'TERM_MATCH', 'Field': 'location', 'Value': region}
+
+def build_work_matrix(accounts, cloud_regions):
+    """
+    Build the list of (account, region) tasks. cloud_regions is either one list of
+    regions for every account or a dict {account: regions}. Tasks are interleaved
+    region by region so consecutive tasks belong to different accounts.
+    """
+    account_regions = [
+        (account, cloud_regions.get(account, []) if isinstance(cloud_regions, dict) else cloud_regions)
+        for account in accounts
     ]
-    response = pricing_client.get_products(ServiceCode='AmazonEC2', Filters=filters)
-    for price_item in response['PriceList']:
-        price_data = json.loads(price_item)
-        on_demand_terms = price_data.get('terms', {}).get('OnDemand', {})
-        for term_value in on_demand_terms.values():
-            price_dimensions = term_value.get('priceDimensions', {})
-            for dimension_value in price_dimensions.values():
-                return float(dimension_value.get('pricePerUnit', {}).get('USD', 0))
-    return 0  # Return 0 if price not found
+    matrix = []
+    for i in range(max((len(regions) for _, regions in account_regions), default=0)):
+        for account, regions in account_regions:
+            if i < len(regions):
+                matrix.append((account, regions[i]))
+    return matrix
+
+
+def scan_account_region(account, region, context, target_role):
+    region_data = []  # Private to this task, merged by the scheduler thread
+    process_volumes(account, [region], context, target_role, region_data)
+    return region_data
+
+
+def iter_scanned_volumes(accounts, cloud_regions, context, target_role, failures=None,
+                         max_workers=MAX_SCAN_WORKERS, per_account_limit=PER_ACCOUNT_SCAN_LIMIT):
+    """
+    Run process_volumes for every account x region pair on a bounded thread pool and
+    yield the volume rows of each pair as soon as it finishes.
+    At most per_account_limit regions of one account are scanned at the same time, and
+    at most max_workers * 2 finished or running pairs are held before the consumer catches up.
+
+    The per-account limit is applied when tasks are submitted, not inside the workers:
+    regions of an account at its limit wait in the account's queue, and the accounts with
+    free slots are served round robin, so no worker ever blocks waiting for an account.
+
+    :param failures: optional list collecting the (account, region) pairs that failed
+    """
+    import collections
+    import concurrent.futures
+
+    queued = {}  # account -> regions not submitted yet, in work matrix order
+    for account, region in build_work_matrix(accounts, cloud_regions):
+        queued.setdefault(account, collections.deque()).append(region)
+    ready = collections.deque(queued)  # accounts with queued regions and a free slot
+    running = collections.Counter()
+    scanned = failed = found = 0
+
+    def collect(done):
+        nonlocal failed, found
+        for future in done:
+            account, region = in_flight.pop(future)
+            running[account] -= 1
+            # The account was taken off ready when it reached its limit
+            if queued.get(account) and running[account] == per_account_limit - 1:
+                ready.append(account)
+            try:
+                rows = future.result()
+            except Exception as e:
+                print(f"Error scanning volumes for account {account} in {region}: {e}")
+                failed += 1
+                if failures is not None:
+                    failures.append((account, region))
+                continue
+            found += len(rows)
+            yield from rows
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        in_flight = {}
+        while ready or in_flight:
+            while ready and len(in_flight) < max_workers * 2:
+                account = ready.popleft()
+                region = queued[account].popleft()
+                running[account] += 1
+                if queued[account] and running[account] < per_account_limit:
+                    ready.append(account)
+                future = executor.submit(scan_account_region, account, region, context, target_role)
+                in_flight[future] = (account, region)
+                scanned += 1
+            done, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+            yield from collect(done)
+
+    print(f"Scanned {scanned} account/region pairs, {failed} failed, {found} volumes found.")
+
+
+def scan_accounts(accounts, cloud_regions, context, target_role, data,
+                  max_workers=MAX_SCAN_WORKERS, per_account_limit=PER_ACCOUNT_SCAN_LIMIT):
+    """
+    Run process_volumes for every account x region pair on a bounded thread pool.
+    At most per_account_limit regions of one account are scanned at the same time.
+    Results are appended to data as tasks finish, so wall time follows the slowest region.
+
+    :return: list of (account, region) pairs that failed
+    """
+    failures = []
+    data.extend(iter_scanned_volumes(accounts, cloud_regions, context, target_role, failures,
+                                     max_workers, per_account_limit))
+    return failures
+
+
+def get_volume_price(pricing_client, volume_type, region, product_family='Storage'):
+    # region is a region code, so it is matched on regionCode (location holds names like 'US East (N. Virginia)').
+    # product_family 'System Operation' / 'Provisioned Throughput' returns the IOPS / throughput price
+    # (for tiered IOPS the tier 1 price).
+    filters = pricing_filters(region, volume_type, product_family)
+
+    def fetch_price():
+        # Stops after the first priced item, so later pages are never requested
+        for price_data in iter_products(pricing_client, filters):
+            if is_upper_iops_tier(price_data.get('product', {})):
+                continue
+            on_demand_terms = price_data.get('terms', {}).get('OnDemand', {})
+            for term_value in on_demand_terms.values():
+                price_dimensions = term_value.get('priceDimensions', {})
+                for dimension_value in price_dimensions.values():
+                    return float(dimension_value.get('pricePerUnit', {}).get('USD', 0))
+        return 0  # Return 0 if price not found
+
+    # One Pricing API call per (volume type, region) instead of one per volume.
+    # IOPS prices use their own key so entries cached before tiers were told apart are not reused.
+    service = 'AmazonEC2.iops-tier1' if product_family == 'System Operation' else 'AmazonEC2'
+    return get_or_load(cache_key(service, region, filters), fetch_price)
+
+def known_table_key(dynamo_client, table_name):
+    """
+    Key of table_name in _known_tables: a table with the same name in another region,
+    account or endpoint (e.g. DynamoDB Local) is a different table. Clients are shared
+    per (region, credentials) by client_factory and kept for the container's lifetime,
+    so the client's id stands for its credentials.
+    """
+    return dynamo_client.meta.endpoint_url, dynamo_client.meta.region_name, id(dynamo_client), table_name
+
 
 def ensure_table_exists(dynamo_client, table_name):
+    key = known_table_key(dynamo_client, table_name)
+    if key in _known_tables:
+        return
     try:
         dynamo_client.describe_table(TableName=table_name)
         print(f"Table {table_name} already exists.")
@@ -72,40 +257,160 @@ def ensure_table_exists(dynamo_client, table_name):
         )
         dynamo_client.get_waiter('table_exists').wait(TableName=table_name)
         print(f"Table {table_name} created successfully.")
+    _known_tables.add(key)
+
+@profiled('calculate_and_upload_cost_savings')
+def calculate_and_upload_cost_savings(data, pricing_client=None, dynamo_client=None, table_name='VolumeCostSavings',
+                                      max_workers=4, chunk_size=1000, queue_depth=4, rollup_table='VolumeSavingsRollups'):
+    """
+    Price volume rows and upload their monthly savings to DynamoDB as a stream.
 
-def calculate_and_upload_cost_savings(data, pricing_client, dynamo_client, table_name='VolumeCostSavings'):
+    data may be a list or any iterable of rows, e.g. iter_scanned_volumes(...) or
+    inventory_stream.iter_report_rows('s3://bucket/orphaned_volumes-<date>.csv').
+    Rows are read on one thread, priced chunk by chunk on another and written by
+    batch_write_items. The bounded queues between the stages hold at most queue_depth
+    chunks, so a slow stage blocks the one before it and memory use does not grow
+    with the size of the inventory.
+
+    The written volumes are also added to the per account, account+region and
+    account+month rollups in rollup_table (None skips them), which dashboards read
+    with savings_rollups.get_rollup instead of scanning table_name. Only the change
+    against the row a volume replaces is booked, after every written batch, so the
+    account and region rollups stay equal to the sums of table_name across runs.
+    """
+    from dynamo_batch import batch_get_items, batch_write_items, chunk_items
+    from cost_engine import DIMENSIONS, inventory_monthly_costs
+    from savings_rollups import add_to_rollups, ensure_rollup_table, flush_rollups
+
+    # Reuse the container's shared clients unless the caller passes its own
+    pricing_client = pricing_client or get_client('pricing', 'us-east-1')
+    dynamo_client = dynamo_client or get_client('dynamodb')
+    pricing_client = rate_limit_client(instrument_client(pricing_client))
+    dynamo_client = rate_limit_client(instrument_client(dynamo_client))
     ensure_table_exists(dynamo_client, table_name)
-    
-    for volume in data:
-        # Assuming data structure: [name, id, account, region, size, type, create_time, target_date, excluded]
-        volume_id = volume[1]
-        account = volume[2]
-        region = volume[3]
-        size = int(volume[4])
-        volume_type = volume[5]
-        target_termination_date = volume[7]
-
-        volume_price = get_volume_price(pricing_client, volume_type, region)
-        cost_savings = size * volume_price * 30  # Estimated monthly savings
-
-        # Upload to DynamoDB
-        dynamo_client.put_item(
-            TableName=table_name,
-            Item={
-                'VolumeId': {'S': volume_id},
-                'AccountId': {'S': account},
-                'Region': {'S': region},
-                'CostSavings': {'N': str(cost_savings)},
-                'TargetTerminationDate': {'S': target_termination_date}
+    if rollup_table is not None and known_table_key(dynamo_client, rollup_table) not in _known_tables:
+        ensure_rollup_table(dynamo_client, rollup_table)
+        _known_tables.add(known_table_key(dynamo_client, rollup_table))
+
+    product_families = {unit: product_family for _, unit, product_family in DIMENSIONS}
+
+    def price_of(region, volume_type, unit):
+        return get_volume_price(pricing_client, volume_type, region, product_families[unit]) or None
+
+    # Rollups are booked as deltas against the stored rows, so re-running an inventory
+    # does not count its volumes again. previous holds, per in-flight item, the row it
+    # replaces; pending the latest not yet written item per key.
+    previous = {}
+    pending = {}
+    pending_lock = threading.Lock()
+
+    def with_previous_rows(items):
+        keys = [(item['VolumeId']['S'], item['AccountId']['S']) for item in items]
+        with pending_lock:
+            # An earlier occurrence still in flight is what this item replaces
+            in_flight = {key: pending[key] for key in keys if key in pending}
+        stored = batch_get_items(
+            dynamo_client, table_name,
+            [{'VolumeId': {'S': key[0]}, 'AccountId': {'S': key[1]}} for key in set(keys) - set(in_flight)],
+            ['VolumeId', 'AccountId', 'Region', 'CostSavings'])
+        rows = dict(in_flight)
+        rows.update(((row['VolumeId']['S'], row['AccountId']['S']), row) for row in stored)
+        with pending_lock:
+            for key, item in zip(keys, items):
+                previous[id(item)] = rows.get(key)
+                pending[key] = item
+        return items
+
+    def priced_chunks():
+        # Read stage: rows are pulled from data on a background thread, queue_depth chunks ahead
+        for chunk in prefetch_pages(chunk_items(data, chunk_size), queue_depth):
+            # Monthly storage + IOPS + throughput cost of the chunk in one vectorized pass, stored
+            # at the CostSavings scale; prices are cached per (region, volume type). Volumes without a price save 0.
+            # Row layout: [name, id, account, region, size, type, create_time, target_date, excluded, (iops), (throughput)]
+            with phase('price_resolve'):
+                savings = (inventory_monthly_costs(chunk, price_of) * COST_SAVINGS_FACTOR).tolist()
+            items = {
+                (volume[1], volume[2]): {
+                    'VolumeId': {'S': volume[1]},
+                    'AccountId': {'S': volume[2]},
+                    'Region': {'S': volume[3]},
+                    'CostSavings': {'N': str(cost_savings if cost_savings == cost_savings else 0)},  # NaN -> 0
+                    'TargetTerminationDate': {'S': volume[7]}
+                }
+                for volume, cost_savings in zip(chunk, savings)
             }
-        )
+            # A volume listed twice in a chunk is written once, with its last row
+            items = list(items.values())
+            yield with_previous_rows(items) if rollup_table is not None else items
+
+    def cost_savings_items():
+        # Price stage: runs on its own thread, queue_depth chunks ahead of the writer
+        for items in prefetch_pages(priced_chunks(), queue_depth):
+            yield from items
+
+    # Rollup deltas of the written volumes, booked in the month of the run
+    rollups = {}
+    rollups_updated = 0
+    month = datetime.now(timezone.utc).strftime('%Y-%m')
+
+    def add_written_to_rollups(items):
+        # Book each written batch and flush it right away, so a timeout loses at most one batch
+        nonlocal rollups_updated
+        for item in items:
+            key = (item['VolumeId']['S'], item['AccountId']['S'])
+            with pending_lock:
+                old = previous.pop(id(item), None)
+                if pending.get(key) is item:
+                    del pending[key]
+            if old is not None:
+                add_to_rollups(rollups, old['AccountId']['S'], old['Region']['S'], month,
+                               -float(old['CostSavings']['N']), volumes=-1)
+            add_to_rollups(rollups, item['AccountId']['S'], item['Region']['S'], month, float(item['CostSavings']['N']))
+        with phase('dynamodb_write'):
+            rollups_updated += flush_rollups(dynamo_client, rollups, rollup_table)
+
+    def forget_failed(items):
+        # An unwritten item replaces nothing: later items of its key are booked against the
+        # row it would have replaced instead
+        with pending_lock:
+            for item in items:
+                key = (item['VolumeId']['S'], item['AccountId']['S'])
+                old = previous.pop(id(item), None)
+                if pending.get(key) is item:
+                    if old is not None and id(old) in previous:
+                        pending[key] = old  # an earlier occurrence is still in flight
+                    else:
+                        del pending[key]
+                for item_id, row in list(previous.items()):
+                    if row is item:
+                        previous[item_id] = old
+
+    # Upload to DynamoDB in concurrent 25-item BatchWriteItem requests
+    result = batch_write_items(dynamo_client, table_name, cost_savings_items(), max_workers=max_workers,
+                               on_written=add_written_to_rollups if rollup_table is not None else None,
+                               on_failed=forget_failed if rollup_table is not None else None)
+    if rollup_table is not None:
+        result['rollups'] = rollups_updated
 
-    print(f"Cost savings data for {len(data)} volumes uploaded to DynamoDB table {table_name}.")
+    print(f"Cost savings data for {result['written']} volumes uploaded to DynamoDB table {table_name} "
+          f"in {result['seconds']:.2f}s ({result['items_per_second']:.0f} items/s).")
+    if result['unprocessed']:
+        print(f"{result['unprocessed']} volumes could not be written to {table_name}.")
+    emit_metrics('calculate_and_upload_cost_savings')
+    return result
 
 
 # Example usage in your main lambda_handler:
 # def lambda_handler(event, context):
+#     # Streaming: scan and upload without building the data list
+#     #     calculate_and_upload_cost_savings(iter_scanned_volumes(accounts, cloud_regions, context, target_role))
+#     # or re-price an existing report from S3:
+#     #     from inventory_stream import iter_report_rows
+#     #     calculate_and_upload_cost_savings(iter_report_rows(f's3://{bucket}/orphaned_volumes-{current_date}'))
+#
 #     # ... (your existing code to process volumes and create 'data' list)
+#     data = []
+#     failures = scan_accounts(accounts, cloud_regions, context, target_role, data)
 #     
 #     if data:
 #         report_name = f'orphaned_volumes-{current_date}'
@@ -113,6 +418,5 @@ def calculate_and_upload_cost_savings(data, pricing_client, dynamo_client, table
 #         report = write_csv(report_name, schema, data)
 #         upload = push_to_s3(report_name, bucket)
 #         
-#         pricing_client = boto3.client('pricing', region_name='us-east-1')
-#         dynamo_client = boto3.client('dynamodb')
-#         calculate_and_upload_cost_savings(data, pricing_client, dynamo_client, 'MyVolumesCostSavings')
+#         # Clients are created on first use and reused across warm invocations
+#         calculate_and_upload_cost_savings(data, table_name='MyVolumesCostSavings')
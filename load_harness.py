@@ -0,0 +1,250 @@
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Regions of the synthetic fleet, in the order they are assigned to accounts
+FLEET_REGIONS = [
+    'us-east-1', 'us-east-2', 'us-west-1', 'us-west-2', 'ca-central-1', 'sa-east-1',
+    'eu-west-1', 'eu-west-2', 'eu-west-3', 'eu-central-1', 'eu-north-1', 'eu-south-1',
+    'ap-south-1', 'ap-northeast-1', 'ap-northeast-2', 'ap-southeast-1', 'ap-southeast-2', 'me-south-1',
+    'us-gov-west-1', 'us-gov-east-1',
+]
+# Volume types of the synthetic fleet and their share of the volumes
+VOLUME_MIX = [('gp2', 0.45), ('gp3', 0.3), ('io1', 0.05), ('io2', 0.05), ('st1', 0.08), ('sc1', 0.05), ('standard', 0.02)]
+# Price unit the Pricing API returns per product family
+PRICE_UNITS = {'Storage': 'GB-Mo', 'System Operation': 'IOPS-Mo', 'Provisioned Throughput': 'GiBps-mo'}
+# Stages reported with latency percentiles, in pipeline order (see run_metrics.phase)
+STAGES = ['scan', 'fetch', 'price_resolve', 'dynamodb_write']
+
+
+def synthetic_volume(account, region, i, rng):
+    """
+    Return one process_volumes row:
+    [name, id, account, region, size, type, create_time, target_date, excluded, iops, throughput]
+    """
+    volume_type = rng.choices([t for t, _ in VOLUME_MIX], [share for _, share in VOLUME_MIX])[0]
+    iops = rng.choice([3000, 6000, 16000]) if volume_type in ('gp3', 'io1', 'io2') else 0
+    throughput = rng.choice([125, 250, 1000]) if volume_type == 'gp3' else 0
+    return [f"vol-{account}-{region}-{i}", f"vol-{account[-6:]}{region}{i:06d}", account, region,
+            rng.choice([8, 20, 100, 500, 2000]), volume_type, '2025-01-01T00:00:00Z', '2026-11-01', 'False',
+            iops, throughput]
+
+
+def make_process_volumes(volumes_per_region, scan_latency=0.0, seed=42):
+    """
+    Return a stand-in for lambda_pricing_01.process_volumes that produces
+    volumes_per_region synthetic volumes per account and region instead of
+    calling EC2 DescribeVolumes. scan_latency (seconds) emulates the EC2 calls.
+    """
+    from run_metrics import phase
+
+    def process_volumes(account, cloud_regions, context, target_role, data):
+        for region in cloud_regions:
+            with phase('scan'):
+                if scan_latency:
+                    time.sleep(scan_latency)
+                rng = random.Random(f"{seed}/{account}/{region}")
+                data.extend(synthetic_volume(account, region, i, rng) for i in range(volumes_per_region))
+    return process_volumes
+
+
+def price_item(region, volume_type, product_family):
+    """
+    Return the GetProducts PriceList entry (a JSON string) of one EBS price; prices are
+    random but stable per (region, volume type, product family).
+    """
+    rng = random.Random(f"{region}/{volume_type}/{product_family}")
+    sku = f"SKU{rng.randrange(10 ** 9):09d}"
+    unit = PRICE_UNITS.get(product_family, 'GB-Mo')
+    return json.dumps({
+        'product': {'sku': sku, 'productFamily': product_family,
+                    'attributes': {'regionCode': region, 'volumeApiName': volume_type}},
+        'terms': {'OnDemand': {f"{sku}.JRTCKXETXF": {
+            'offerTermCode': 'JRTCKXETXF', 'sku': sku,
+            'priceDimensions': {f"{sku}.JRTCKXETXF.6YS6EN2CT7": {
+                'unit': unit, 'pricePerUnit': {'USD': f"{rng.uniform(0.01, 0.2):.10f}"}
+            }}
+        }}},
+        'version': '20261001000000', 'publicationDate': '2026-10-01T00:00:00Z'
+    })
+
+
+class FakePricingHandler(BaseHTTPRequestHandler):
+    """
+    Minimal Pricing API (GetProducts) that answers the filters sent by
+    pricing_api.pricing_filters with one synthetic price item.
+    """
+    latency = 0.0
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        if not self.headers.get('X-Amz-Target', '').endswith('.GetProducts'):
+            self._respond(400, {'__type': 'InvalidParameterException', 'message': 'Only GetProducts is supported'})
+            return
+        fields = {f['Field']: f['Value'] for f in request.get('Filters', [])}
+        price_list = []
+        if 'regionCode' in fields and 'volumeApiName' in fields:
+            price_list.append(price_item(fields['regionCode'], fields['volumeApiName'],
+                                         fields.get('productFamily', 'Storage')))
+        if self.latency:
+            time.sleep(self.latency)
+        self._respond(200, {'FormatVersion': 'aws_v1', 'PriceList': price_list})
+
+    def _respond(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/x-amz-json-1.1')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_pricing(latency=0.0):
+    """
+    Start the fake Pricing API on a free local port, in a daemon thread.
+
+    :return: (server, endpoint URL)
+    """
+    handler = type('FakePricing', (FakePricingHandler,), {'latency': latency})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def percentile(samples, q):
+    # Nearest-rank percentile of sorted samples
+    if not samples:
+        return None
+    return samples[min(len(samples) - 1, max(0, int(round(q / 100 * len(samples))) - 1))]
+
+
+def run_load(accounts, regions, volumes_per_region, dynamodb_endpoint=None, scan_latency=0.0,
+             pricing_latency=0.0, max_workers=None, table_name='VolumeCostSavings', trace_memory=True):
+    """
+    Run the Lambda savings pipeline (iter_scanned_volumes -> calculate_and_upload_cost_savings,
+    the streaming flow of lambda_handler) end to end against local stand-ins: DynamoDB is
+    moto in this process unless dynamodb_endpoint (e.g. DynamoDB Local) is given, and the
+    Pricing API is a local fake. process_volumes is replaced by a synthetic fleet scanner.
+
+    :return: dict with volumes written, throughput, per-stage latency percentiles and peak memory
+    """
+    import contextlib
+
+    server, pricing_endpoint = start_fake_pricing(pricing_latency)
+    os.environ['AWS_ENDPOINT_URL_PRICING'] = pricing_endpoint
+    if dynamodb_endpoint:
+        os.environ['AWS_ENDPOINT_URL_DYNAMODB'] = dynamodb_endpoint
+    for name, value in (('AWS_ACCESS_KEY_ID', 'testing'), ('AWS_SECRET_ACCESS_KEY', 'testing'),
+                        ('AWS_DEFAULT_REGION', 'us-east-1'), ('function_name', 'load_harness')):
+        os.environ.setdefault(name, value)
+
+    import pricing_cache
+    import lambda_pricing_01
+    from run_metrics import add_phase_listener, remove_phase_listener
+
+    pricing_cache.PRICING_CACHE_DIR = tempfile.mkdtemp(prefix='load_harness_cache_')  # cold prices every run
+    lambda_pricing_01.process_volumes = make_process_volumes(volumes_per_region, scan_latency)
+    account_ids = [f"{100000000000 + i:012d}" for i in range(accounts)]
+    cloud_regions = FLEET_REGIONS[:regions]
+
+    samples = {}
+    samples_lock = threading.Lock()
+
+    def record(name, seconds):
+        with samples_lock:
+            samples.setdefault(name, []).append(seconds)
+
+    if dynamodb_endpoint:
+        backend = contextlib.nullcontext()
+    else:
+        from moto import mock_aws
+        backend = mock_aws()
+
+    add_phase_listener(record)
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        with backend:
+            start = time.perf_counter()
+            failures = []
+            volumes = lambda_pricing_01.iter_scanned_volumes(
+                account_ids, cloud_regions, None, 'load-harness', failures,
+                max_workers=max_workers or lambda_pricing_01.MAX_SCAN_WORKERS)
+            result = lambda_pricing_01.calculate_and_upload_cost_savings(volumes, table_name=table_name)
+            seconds = time.perf_counter() - start
+        peak_mb = tracemalloc.get_traced_memory()[1] / (1024 * 1024) if trace_memory else None
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+        remove_phase_listener(record)
+        server.shutdown()
+
+    stages = {}
+    for name in STAGES + sorted(set(samples) - set(STAGES)):
+        if name in samples:
+            values = sorted(samples[name])
+            stages[name] = {'count': len(values), 'p50_ms': percentile(values, 50) * 1000,
+                            'p99_ms': percentile(values, 99) * 1000, 'total_s': sum(values)}
+    return {
+        'accounts': accounts, 'regions': len(cloud_regions), 'volumes_per_region': volumes_per_region,
+        'backend': dynamodb_endpoint or 'moto (in process)', 'volumes_written': result['written'],
+        'unprocessed': result['unprocessed'], 'failed_scans': len(failures), 'seconds': seconds,
+        'volumes_per_second': result['written'] / seconds if seconds else 0.0,
+        'stages': stages, 'peak_traced_mb': peak_mb,
+        'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Offline end-to-end load test of the Lambda savings pipeline against local AWS stand-ins.")
+    parser.add_argument('--accounts', type=int, default=100, help="synthetic accounts (e.g. 10000)")
+    parser.add_argument('--regions', type=int, default=20, help=f"regions per account (max {len(FLEET_REGIONS)})")
+    parser.add_argument('--volumes', type=int, default=10, help="volumes per account and region")
+    parser.add_argument('--dynamodb-endpoint', help="DynamoDB Local or moto server URL; default moto in process")
+    parser.add_argument('--scan-latency-ms', type=float, default=0.0, help="emulated EC2 scan time per region")
+    parser.add_argument('--pricing-latency-ms', type=float, default=0.0, help="emulated Pricing API latency")
+    parser.add_argument('--max-workers', type=int, help="scan threads, default MAX_SCAN_WORKERS")
+    parser.add_argument('--dynamodb-rate', type=float,
+                        help="pin the starting client side DynamoDB item rate; by default tables start unthrottled")
+    parser.add_argument('--pricing-rate', type=float, default=1e6, help="client side Pricing API request rate")
+    parser.add_argument('--no-tracemalloc', action='store_true', help="skip tracemalloc (faster, RSS only)")
+    parser.add_argument('--output', default='load_results.json', help="where to write the results")
+    args = parser.parse_args()
+
+    # rate_limiter reads its starting rates at import
+    if args.dynamodb_rate:
+        os.environ['DYNAMODB_TABLE_RATE'] = str(args.dynamodb_rate)
+    os.environ['PRICING_API_RATE'] = str(args.pricing_rate)
+
+    report = run_load(args.accounts, min(args.regions, len(FLEET_REGIONS)), args.volumes, args.dynamodb_endpoint,
+                      args.scan_latency_ms / 1000, args.pricing_latency_ms / 1000, args.max_workers,
+                      trace_memory=not args.no_tracemalloc)
+
+    print(f"\n{report['volumes_written']} volumes ({report['accounts']} accounts x {report['regions']} regions x "
+          f"{report['volumes_per_region']}) in {report['seconds']:.2f}s: {report['volumes_per_second']:,.0f} volumes/s")
+    for name, stage in report['stages'].items():
+        print(f"{name:<16} {stage['count']:>9} calls  p50 {stage['p50_ms']:>9.3f} ms  p99 {stage['p99_ms']:>9.3f} ms")
+    if report['peak_traced_mb'] is not None:
+        print(f"Peak traced memory {report['peak_traced_mb']:.1f} MB", end=', ')
+    print(f"max RSS {report['max_rss_mb']:.1f} MB"
+          + (" (includes the in-process moto tables)" if not args.dynamodb_endpoint else ""))
+
+    with open(args.output, 'w') as f:
+        json.dump({'python': sys.version.split()[0], 'created_at': int(time.time()), **report}, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
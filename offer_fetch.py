@@ -0,0 +1,81 @@
+import asyncio
+
+import aiohttp
+
+from offer_stream import is_ebs_product, load_offer_slice_async
+from pricing_cache import cache_key, is_fresh, read_entry, touch_entry, write_entry
+from run_metrics import add_bytes_downloaded, phase
+
+OFFER_BASE_URL = 'https://pricing.us-east-1.amazonaws.com'
+MAX_OFFER_DOWNLOADS = 8
+
+
+def offer_url(region, service='AmazonEC2'):
+    return f'{OFFER_BASE_URL}/offers/v1.0/aws/{service}/current/{region}/index.json'
+
+
+def region_index_url(service='AmazonEC2'):
+    return f'{OFFER_BASE_URL}/offers/v1.0/aws/{service}/current/region_index.json'
+
+
+async def fetch_offer_async(session, url, key, keep_product, limit):
+    """
+    Download and stream-parse one offer file, sharing the on-disk pricing cache
+    (and its conditional GET revalidation) with pricing_cache.fetch_offer_cached.
+    """
+    entry = read_entry(key)
+    if is_fresh(entry):
+        return entry['value']
+
+    headers = {'Accept-Encoding': 'gzip'}
+    if entry is not None:
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+
+    async with limit:
+        async with session.get(url, headers=headers) as response:
+            if response.status == 304 and entry is not None:
+                return touch_entry(key, entry)['value']
+            response.raise_for_status()
+            with phase('fetch'):
+                data = await load_offer_slice_async(response.content, keep_product)
+            add_bytes_downloaded(response.content.total_bytes)
+            etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+    write_entry(key, data, etag, last_modified)
+    return data
+
+
+async def fetch_region_offers_async(regions=None, service='AmazonEC2', keep_product=is_ebs_product,
+                                    cache_filter='ebs', max_concurrency=MAX_OFFER_DOWNLOADS):
+    """
+    Download the offer files of many regions at once over one pooled keep-alive session.
+
+    :param regions: region codes; None downloads region_index.json and fetches every region
+    :param keep_product: product filter passed to the streaming parser
+    :param cache_filter: cache key component describing keep_product (see pricing_cache.cache_key)
+    :param max_concurrency: maximum concurrent downloads (and pooled connections)
+    :return: dict {region: offer slice, or the exception raised for that region}
+    """
+    connector = aiohttp.TCPConnector(limit=max_concurrency, keepalive_timeout=60)
+    limit = asyncio.Semaphore(max_concurrency)
+    async with aiohttp.ClientSession(connector=connector, auto_decompress=True) as session:
+        if regions is None:
+            async with session.get(region_index_url(service), headers={'Accept-Encoding': 'gzip'}) as response:
+                response.raise_for_status()
+                regions = sorted((await response.json(content_type=None))['regions'])
+        results = await asyncio.gather(
+            *(fetch_offer_async(session, offer_url(region, service), cache_key(service, region, cache_filter), keep_product, limit)
+              for region in regions),
+            return_exceptions=True
+        )
+    return dict(zip(regions, results))
+
+
+def fetch_region_offers(regions=None, service='AmazonEC2', keep_product=is_ebs_product,
+                        cache_filter='ebs', max_concurrency=MAX_OFFER_DOWNLOADS):
+    """
+    Blocking wrapper around fetch_region_offers_async for scripts and Lambda handlers.
+    """
+    return asyncio.run(fetch_region_offers_async(regions, service, keep_product, cache_filter, max_concurrency))
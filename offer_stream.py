@@ -0,0 +1,93 @@
+import ijson
+
+# Top level scalar fields of an offer file worth keeping (offer version etc.)
+OFFER_META_FIELDS = ('formatVersion', 'offerCode', 'version', 'publicationDate')
+
+
+def is_ebs_product(product):
+    """
+    Default filter for load_offer_slice: keep products that describe an EBS volume
+    (storage, provisioned IOPS and throughput all carry a volume type attribute).
+    """
+    attributes = product.get('attributes', {})
+    return 'volumeApiName' in attributes or 'volumeType' in attributes
+
+
+def offer_slice_handler(keep_product=is_ebs_product):
+    """
+    Return (data, handle_event): feed every ijson (prefix, event, value) of an
+    offer file to handle_event and data fills up with the kept products, their
+    OnDemand terms and the offer metadata. Shared by the sync and async parsers.
+    """
+    data = {'products': {}, 'terms': {'OnDemand': {}}}
+    products = data['products']
+    on_demand = data['terms']['OnDemand']
+
+    builder = None   # ObjectBuilder for the entry being collected
+    target = None    # dict the finished entry goes into (None = skip the entry)
+    key = None
+    depth = 0
+
+    def handle_event(prefix, event, value):
+        nonlocal builder, target, key, depth
+        if key is not None:
+            # Inside a products.<sku> or terms.OnDemand.<sku> entry
+            if builder is not None:
+                builder.event(event, value)
+            if event in ('start_map', 'start_array'):
+                depth += 1
+            elif event in ('end_map', 'end_array'):
+                depth -= 1
+            if depth == 0:
+                if builder is not None:
+                    entry = builder.value
+                    if target is not products or keep_product(entry):
+                        target[key] = entry
+                builder, target, key = None, None, None
+            return
+
+        if event == 'map_key' and prefix == 'products':
+            key, target = value, products
+            builder = ijson.ObjectBuilder()
+        elif event == 'map_key' and prefix == 'terms.OnDemand':
+            # Terms follow products in the offer file, so unwanted SKUs are skipped
+            # without building them at all.
+            key = value
+            if value in products:
+                target = on_demand
+                builder = ijson.ObjectBuilder()
+        elif prefix in OFFER_META_FIELDS and event == 'string':
+            data[prefix] = value
+
+    return data, handle_event
+
+
+def load_offer_slice(stream, keep_product=is_ebs_product):
+    """
+    Stream an AmazonEC2 offer file (index.json) and keep only the products accepted
+    by keep_product and their OnDemand terms. Nothing else in the file is ever
+    materialised, so memory stays flat no matter how big the offer file is.
+
+    The return value has the same shape as the full offer file, so code written
+    against json.loads(response.read()) keeps working unchanged:
+        {'version': ..., 'products': {sku: product}, 'terms': {'OnDemand': {sku: term}}}
+
+    :param stream: binary file-like object (urllib response, requests raw stream, open file)
+    :param keep_product: callable(product) -> bool
+    :return: dict with the filtered products, OnDemand terms and offer metadata
+    """
+    data, handle_event = offer_slice_handler(keep_product)
+    for prefix, event, value in ijson.parse(stream):
+        handle_event(prefix, event, value)
+    return data
+
+
+async def load_offer_slice_async(stream, keep_product=is_ebs_product):
+    """
+    Same as load_offer_slice for an async stream (object with an async read(n),
+    e.g. aiohttp's response.content), parsed as the bytes arrive.
+    """
+    data, handle_event = offer_slice_handler(keep_product)
+    async for prefix, event, value in ijson.parse_async(stream):
+        handle_event(prefix, event, value)
+    return data
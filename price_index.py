@@ -0,0 +1,117 @@
+import json
+import re
+
+# Map full location names to region codes for price items without a regionCode attribute.
+# Pricing API items carry regionCode, so this only covers legacy GovCloud rows and offer data.
+LOCATION_REGION_CODES = {
+    "AWS GovCloud (US-West)": "us-gov-west-1",
+    "AWS GovCloud (US-East)": "us-gov-east-1"
+}
+GOVCLOUD_REGIONS = ('us-gov-west-1', 'us-gov-east-1')
+
+# Volume type aliases accepted by get_volume_price -> (volumeApiName, unit) candidates
+VOLUME_TYPE_ALIASES = {
+    'Provisioned IOPS': [('io1', 'IOPS-Mo'), ('Provisioned IOPS', 'IOPS-Mo')]
+}
+
+# io2 has one IOPS SKU per tier (usagetype '...VolumeP-IOPS.io2.tier2', group 'EBS IOPS Tier 2');
+# cost_engine.IOPS_TIERS scales the tier 1 price, so the other tiers are not indexed
+UPPER_IOPS_TIER = re.compile(r'tier\s*[2-9]', re.IGNORECASE)
+
+# Indexes built from offer slices, remembered per region together with the slice they came from
+_offer_indexes = {}
+
+
+def is_upper_iops_tier(product):
+    attributes = product.get('attributes', {})
+    return any(UPPER_IOPS_TIER.search(attributes.get(name, '')) for name in ('usagetype', 'group'))
+
+
+def _add_product(index, region_code, product, terms):
+    """
+    Add every OnDemand USD price dimension of one product to the index.
+    The first price seen for a (region, volume, unit) key wins, like the old linear scans;
+    IOPS tiers above tier 1 are skipped.
+    """
+    if is_upper_iops_tier(product):
+        return
+    attributes = product.get('attributes', {})
+    volume_api_name = attributes.get('volumeApiName', attributes.get('volumeType', 'Unknown'))
+    for term_value in terms.values():
+        for dimension_value in term_value.get('priceDimensions', {}).values():
+            price = dimension_value.get('pricePerUnit', {}).get('USD')
+            if price is None:
+                continue
+            key = (region_code, volume_api_name, dimension_value.get('unit'))
+            if key not in index:
+                index[key] = float(price)
+
+
+def build_price_index_from_price_list(price_list, region_mapping=None, regions=None):
+    """
+    Build a price index from a Pricing API PriceList (JSON strings or decoded items, see get_pricing_info).
+
+    :param price_list: iterable of price items returned by get_products
+    :param region_mapping: optional location -> region code map; when given, only those locations are indexed
+    :param regions: optional region codes; when given, only those regions are indexed
+    :return: dict {(region_code, volume_api_name, unit): price_per_unit}
+    """
+    index = {}
+    for price_item in price_list:
+        price_data = json.loads(price_item) if isinstance(price_item, str) else price_item
+        attributes = price_data['product']['attributes']
+        location = attributes.get('location', 'N/A')
+        if region_mapping is not None:
+            if location not in region_mapping:
+                continue
+            region_code = region_mapping[location]
+        else:
+            region_code = attributes.get('regionCode', LOCATION_REGION_CODES.get(location, location))
+        if regions is not None and region_code not in regions:
+            continue
+        _add_product(index, region_code, price_data['product'], price_data.get('terms', {}).get('OnDemand', {}))
+    return index
+
+
+def build_price_index_from_offer(data, region):
+    """
+    Build a price index from a (sliced) regional offer file, see offer_stream.load_offer_slice.
+
+    :param data: offer file dict with 'products' and 'terms'
+    :param region: region code the offer file belongs to
+    :return: dict {(region_code, volume_api_name, unit): price_per_unit}
+    """
+    index = {}
+    on_demand = data.get('terms', {}).get('OnDemand', {})
+    for sku, product in data.get('products', {}).items():
+        if sku in on_demand:
+            _add_product(index, region, product, on_demand[sku])
+    return index
+
+
+def get_offer_price_index(data, region):
+    """
+    Return the price index for an offer slice, building it only when the slice changed.
+    """
+    cached = _offer_indexes.get(region)
+    if cached is None or cached[0] is not data:
+        cached = (data, build_price_index_from_offer(data, region))
+        _offer_indexes[region] = cached
+    return cached[1]
+
+
+def lookup_price(index, region, volume_type, unit='GB-Mo'):
+    """
+    Constant time price lookup.
+
+    :param index: price index built by one of the build_price_index_* functions
+    :param region: region code (e.g. 'us-gov-west-1')
+    :param volume_type: volume API name (e.g. 'gp2') or an alias such as 'Provisioned IOPS'
+    :param unit: price unit ('GB-Mo', 'IOPS-Mo', ...)
+    :return: price per unit as float, or None if not found
+    """
+    for volume_api_name, alias_unit in VOLUME_TYPE_ALIASES.get(volume_type, [(volume_type, unit)]):
+        price = index.get((region, volume_api_name, alias_unit))
+        if price is not None:
+            return price
+    return None
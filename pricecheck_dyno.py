@@ -1,45 +1,42 @@
 import boto3
 import json
+from decimal import Decimal
+import logging
 import os
 import random
 import string
 import time
+import urllib.error
 import random
+from pricing_api import iter_products_cached, pricing_filters, with_region
+from pricing_cache import cache_key
+from price_index import GOVCLOUD_REGIONS, build_price_index_from_price_list, lookup_price
+from savings_accumulator import add_savings, add_to_savings_item, flush_savings, savings_key, savings_update
+from savings_ledger import apply_once
+from sharded_savings import LEGACY_TRACKER_TABLE, SAVINGS_SHARDS, SHARDED_TRACKER_TABLE, add_sharded_tracker_savings, pick_shard
+from pricing_snapshot import get_offer_price, get_offer_versions, get_pricing_snapshot, snapshot_price
+from volume_pricing import OFFER_STATE_ID, pricing_item_key
+from run_metrics import emit_metrics, phase
+from client_factory import get_client, get_resource, validate_credentials
+from profiling import profiled
+from botocore.exceptions import ClientError
 
-# Function to generate a timestamp-based ID with a random component
-def generate_timestamp_based_id():
-    timestamp = int(time.time() * 1000)  # Current time in milliseconds
-    random_number = random.randint(1000, 9999)  # 4-digit random number
-    return f"{timestamp}-{random_number}"
-
-
-if not gov_aws_session_token:
-        print("GovCloud session token is missing. Please set it to proceed.")
-        return
-    
-    # Validate Commercial session token
-if not aws_session_token:
-      print("Commercial AWS session token is missing. Please set it to proceed.")
-      return
-    
-def validate_session_token(session):
-    try:
-        sts_client = session.client('sts')
-        identity = sts_client.get_caller_identity()
-        print(f"Token is valid. Account: {identity['Account']}, ARN: {identity['Arn']}")
-        return True
-    except Exception as e:
-        print(f"Error validating session token: {str(e)}")
-        return False
+logger = logging.getLogger(__name__)
 
 # Function to query EC2 pricing from the commercial AWS region
-def get_pricing_info(pricing_client, filters):
-    response = pricing_client.get_products(
-        ServiceCode='AmazonEC2',
-        Filters=filters
-    )
-    print(f"Number of items in PriceList: {len(response['PriceList'])}")
-    return response['PriceList']
+def get_pricing_info(pricing_client, filters, regions=None):
+    """
+    Yield every decoded price item matching filters, following NextToken across pages.
+    Pages are prefetched on a background thread and identical queries are served from the pricing cache.
+    With regions, one query per region code is sent, so the API only returns those regions.
+    """
+    count = 0
+    queries = [filters] if regions is None else [with_region(filters, region) for region in regions]
+    for query in queries:
+        for price_data in iter_products_cached(pricing_client, query):
+            count += 1
+            yield price_data
+    print(f"Number of items in PriceList: {count}")
 
 def ensure_table_exists(dynamo_client, table_name):
     try:
@@ -79,7 +76,22 @@ def store_in_dynamodb(dynamodb_client, table_name, volume_id, account_id, volume
     except Exception as e:
         print(f"Error storing data in DynamoDB: {str(e)}")
 
-def store_or_update_in_dynamodb(dynamodb_client, table_name, volume_id, account_id, volume_api_name, storage_media, price_per_unit, location):
+def store_or_update_in_dynamodb(dynamodb_client, table_name, volume_id, account_id, volume_api_name, storage_media, price_per_unit, location,
+                                sku=None, region_code=None, unit=None):
+    """
+    Upsert one price row. Pass the key from volume_pricing.pricing_item_key together with
+    sku, region_code and unit, so the same price always lands on the same item.
+    """
+    update_expression = "SET VolumeApiName = :volume_api_name, StorageMedia = :storage_media, PricePerUnit = :price_per_unit, #location = :location"
+    values = {
+        ':volume_api_name': {'S': volume_api_name},
+        ':storage_media': {'S': storage_media},
+        ':price_per_unit': {'S': str(price_per_unit)},
+        ':location': {'S': location}
+    }
+    if sku is not None:
+        update_expression += ", Sku = :sku, RegionCode = :region_code, #unit = :unit"
+        values.update({':sku': {'S': sku}, ':region_code': {'S': region_code}, ':unit': {'S': str(unit)}})
     try:
         response = dynamodb_client.update_item(
             TableName=table_name,
@@ -87,23 +99,20 @@ def store_or_update_in_dynamodb(dynamodb_client, table_name, volume_id, account_
                 'VolumeId': {'S': volume_id},
                 'AccountId': {'S': account_id}
             },
-            UpdateExpression="SET VolumeApiName = :volume_api_name, StorageMedia = :storage_media, PricePerUnit = :price_per_unit, Location = :location",
-            ExpressionAttributeValues={
-                ':volume_api_name': {'S': volume_api_name},
-                ':storage_media': {'S': storage_media},
-                ':price_per_unit': {'S': str(price_per_unit)},
-                ':location': {'S': location}
-            },
+            UpdateExpression=update_expression,
+            ExpressionAttributeNames={'#location': 'Location', '#unit': 'Unit'} if sku is not None else {'#location': 'Location'},  # reserved words
+            ExpressionAttributeValues=values,
             ReturnValues="UPDATED_NEW"
         )
         print(f"Data inserted or updated successfully for {volume_api_name} in {location} with VolumeId {volume_id}")
+        return True
     except Exception as e:
         print(f"Error storing or updating data in DynamoDB: {str(e)}")
+        return False
 
 # Function to filter and store GovCloud pricing info in DynamoDB
 def print_and_store_govcloud_pricing_info(price_list, dynamodb_client, table_name):
-    for price_item in price_list:
-        price_data = json.loads(price_item)
+    for price_data in price_list:
         attributes = price_data['product']['attributes']
         location = attributes.get('location', 'N/A')
 
@@ -115,10 +124,12 @@ def print_and_store_govcloud_pricing_info(price_list, dynamodb_client, table_nam
             # Extract pricePerUnit for OnDemand terms (USD)
             on_demand_terms = price_data.get('terms', {}).get('OnDemand', {})
             price_per_unit = None
+            unit = None
             for term_key, term_value in on_demand_terms.items():
                 price_dimensions = term_value.get('priceDimensions', {})
                 for dimension_key, dimension_value in price_dimensions.items():
                     price_per_unit = dimension_value.get('pricePerUnit', {}).get('USD', 'N/A')
+                    unit = dimension_value.get('unit')
 
             print(f"Region: {location}")
             print(f"Volume API Name: {volume_api_name}")
@@ -126,53 +137,143 @@ def print_and_store_govcloud_pricing_info(price_list, dynamodb_client, table_nam
             print(f"Price per Unit (USD): {price_per_unit}")
             print("--------------------")
 
-            # Store the data in DynamoDB
-            ensure_table_exists(dynamo_client, table_name)
-            volume_id = generate_timestamp_based_id()
-            account_id = generate_timestamp_based_id()
-            store_in_dynamodb(dynamodb_client, table_name, volume_id, account_id, volume_api_name, storage_media, price_per_unit, location)
-def generate_random_id(length=8):
-     characters = string.ascii_letters + string.digits
-     return ''.join(random.choice(characters) for _ in range(length))
-#1008    
-def get_govcloud_pricing_info(price_list):
-    pricing_info = []  # List to store location and price_per_unit data
+            # Upsert the price under its stable (SKU, region, volume API name, unit) key
+            ensure_table_exists(dynamodb_client, table_name)
+            sku = price_data['product']['sku']
+            region = attributes.get('regionCode', location)
+            volume_id, account_id = pricing_item_key(sku, region, volume_api_name, unit)
+            store_or_update_in_dynamodb(dynamodb_client, table_name, volume_id, account_id, volume_api_name, storage_media,
+                                        price_per_unit, location, sku, region, unit)
+# Key of the item that remembers the offer version and per-SKU prices last stored for a region
+# and set of filters ('<region>#<filters hash>'), so a gp3 or IOPS refresh has its own state
+def offer_state_key(region, filters=None):
+    state_id = region if filters is None else f"{region}#{cache_key(None, region, filters)}"
+    return {'VolumeId': {'S': OFFER_STATE_ID}, 'AccountId': {'S': state_id}}
 
-    # Map full GovCloud location names to region codes
-    region_mapping = {
-        "AWS GovCloud (US-West)": "us-gov-west-1",
-        "AWS GovCloud (US-East)": "us-gov-east-1"
-    }
+def get_offer_state(dynamodb_client, table_name, region, filters=None):
+    """
+    Return (offer version, {sku: price_per_unit}) last stored for region and filters, or (None, {}).
+    """
+    response = dynamodb_client.get_item(TableName=table_name, Key=offer_state_key(region, filters), ConsistentRead=True)
+    item = response.get('Item')
+    if not item:
+        return None, {}
+    version = item.get('Version', {}).get('S')
+    prices = {sku: value['S'] for sku, value in item.get('Prices', {}).get('M', {}).items()}
+    return version, prices
+
+def put_offer_state(dynamodb_client, table_name, region, version, prices, filters=None):
+    item = offer_state_key(region, filters)
+    item['Version'] = {'S': str(version)}
+    item['Prices'] = {'M': {sku: {'S': str(price)} for sku, price in prices.items()}}
+    dynamodb_client.put_item(TableName=table_name, Item=item)
+
+# Incremental refresh: only download when the offer version changed, only write changed prices
+def refresh_govcloud_pricing_info(pricing_client, dynamodb_client, table_name, filters, regions=GOVCLOUD_REGIONS):
+    """
+    Store GovCloud prices in DynamoDB only when AWS published a new offer version,
+    and then only the SKUs whose price changed since the last run. The stored state
+    is kept per region and filters, so refreshes of different volume types or price
+    dimensions do not skip or overwrite each other.
+
+    :return: number of price rows written
+    """
+    ensure_table_exists(dynamodb_client, table_name)
+
+    try:
+        current_versions = get_offer_versions()
+    except Exception as e:
+        print(f"Could not read offer versions, refreshing all regions: {e}")
+        current_versions = {}
+
+    stored_states = {region: get_offer_state(dynamodb_client, table_name, region, filters) for region in regions}
+    changed_regions = [
+        region for region in regions
+        if current_versions.get(region) is None or current_versions[region] != stored_states[region][0]
+    ]
+    if not changed_regions:
+        print(f"GovCloud pricing unchanged (offer versions {current_versions.get(regions[0])}). Nothing to store.")
+        return 0
+
+    new_prices = {region: {} for region in changed_regions}
+    failed_regions = set()
+    written = 0
+    # One regionCode-filtered query per changed region, so only its products are transferred.
+    # ttl=0: the offer changed, so a cached price list from the previous version must not be reused
+    for region in changed_regions:
+        for price_data in iter_products_cached(pricing_client, with_region(filters, region), ttl=0):
+            attributes = price_data['product']['attributes']
+            location = attributes.get('location', 'N/A')
 
-    for price_item in price_list:
-        price_data = json.loads(price_item)
-        attributes = price_data['product']['attributes']
-        location = attributes.get('location', 'N/A')
-        
-        # Filter for GovCloud locations and map to region codes
-        if location in region_mapping:
-            volume_api_name = attributes.get('volumeApiName', 'N/A')
-            storage_media = attributes.get('storageMedia', 'N/A')
-            
             # Extract pricePerUnit for OnDemand terms (USD)
             on_demand_terms = price_data.get('terms', {}).get('OnDemand', {})
             price_per_unit = None
-            for term_key, term_value in on_demand_terms.items():
-                price_dimensions = term_value.get('priceDimensions', {})
-                for dimension_key, dimension_value in price_dimensions.items():
+            unit = None
+            for term_value in on_demand_terms.values():
+                for dimension_value in term_value.get('priceDimensions', {}).values():
                     price_per_unit = dimension_value.get('pricePerUnit', {}).get('USD', 'N/A')
-            
-            # Use the region code instead of the full location name
-            region_code = region_mapping[location]
-            pricing_info.append({'location': region_code, 'price_per_unit': price_per_unit})
+                    unit = dimension_value.get('unit')
 
-    return pricing_info  # Return the list of pricing information
+            sku = price_data['product']['sku']
+            new_prices[region][sku] = str(price_per_unit)
+            if stored_states[region][1].get(sku) == str(price_per_unit):
+                continue
 
-    
-    # for pricing_item in govcloud_pricing_info:
-    #     location = pricing_item['location']
-    #     price_per_unit = pricing_item['price_per_unit']
-    #     print(f"Location: {location}, Price per Unit: {price_per_unit}")
+            # Upsert under the stable (SKU, region, volume API name, unit) key, so runs never add rows
+            volume_api_name = attributes.get('volumeApiName', 'N/A')
+            volume_id, account_id = pricing_item_key(sku, region, volume_api_name, unit)
+            with phase('dynamodb_write'):
+                stored = store_or_update_in_dynamodb(dynamodb_client, table_name, volume_id, account_id,
+                                                     volume_api_name, attributes.get('storageMedia', 'N/A'),
+                                                     price_per_unit, location, sku, region, unit)
+            if stored:
+                written += 1
+            else:
+                failed_regions.add(region)
+
+    # A region with failed writes keeps its old state, so the next run retries it
+    for region in changed_regions:
+        if region not in failed_regions:
+            put_offer_state(dynamodb_client, table_name, region, current_versions.get(region), new_prices[region], filters)
+
+    print(f"Stored {written} changed GovCloud prices for {', '.join(changed_regions)}.")
+    return written
+
+def generate_random_id(length=8):
+     characters = string.ascii_letters + string.digits
+     return ''.join(random.choice(characters) for _ in range(length))
+#1008    
+def get_govcloud_pricing_info(price_list):
+    """
+    Build a price index of the GovCloud prices in price_list.
+    Look prices up with price_index.lookup_price(index, region_code, volume_api_name, unit).
+    """
+    # Price items carry their regionCode, so no location name table is needed
+    return build_price_index_from_price_list(price_list, regions=GOVCLOUD_REGIONS)
+
+    # for (location, volume_api_name, unit), price_per_unit in govcloud_pricing_info.items():
+    #     print(f"Location: {location}, Volume: {volume_api_name}, Price per {unit}: {price_per_unit}")
+
+def get_average_volume_cost(region, volume_type='gp2', com_pricing=None):
+    """
+    Return the price per GB-month of volume_type in region, or None if it is not known.
+
+    :param com_pricing: price index (see get_govcloud_pricing_info); without one the
+                        packaged pricing snapshot is used while it is current, and the
+                        region's offer file otherwise
+    """
+    if com_pricing is not None:
+        return lookup_price(com_pricing, region, volume_type)
+    snapshot = get_pricing_snapshot()
+    if snapshot is not None:
+        price = snapshot_price(snapshot, region, volume_type)
+        if price is not None:
+            return price
+    try:
+        return get_offer_price(region, volume_type)
+    except urllib.error.URLError as e:
+        print(f"Error fetching pricing data: {e}")
+        return None
 
 #1009
 def ensure_vol_savings_table(table_name, region):
@@ -183,7 +284,7 @@ def ensure_vol_savings_table(table_name, region):
     :param region: AWS region
     :return: True if the table exists or was created successfully, False otherwise
     """
-    dynamodb = boto3.resource('dynamodb', region_name=region)
+    dynamodb = get_resource('dynamodb', region)
     
     try:
         table = dynamodb.Table(table_name)
@@ -223,18 +324,26 @@ def ensure_vol_savings_table(table_name, region):
             logger.error(f"Unexpected error: {e}")
             return False
 
-def track_volume_savings(account, size, region):
+def track_volume_savings(account, size, region, volume_id=None):
     """
     Track the savings for each tenant by storing and updating volume sizes in DynamoDB.
     :param account: AWS account ID (tenant)
     :param size: Size of the gp2 volume being deleted (in GB)
     :param region: AWS region of the volume
-    :return: Updated total savings for the account
+    :param volume_id: ID of the deleted volume; when given, the volume is counted exactly
+                      once and a retry or replay returns 0 (see savings_ledger.apply_once)
+    :return: Updated total savings for the account (with SAVINGS_SHARDS > 1, of the
+             updated shard; sum the shards with sharded_savings.get_tracker_savings;
+             with volume_id, the volume's own savings)
     """
     
-    # Initialize DynamoDB client
-    dynamodb = boto3.resource('dynamodb', region_name=region)
-    table_name = 'VolumesSavingsTracker'
+    # Shared per-thread DynamoDB resource on the pooled client
+    dynamodb = get_resource('dynamodb', region)
+    # Low-level client for the helpers that build {'S': ...} values themselves; the
+    # resource's client would serialise those dicts again as maps
+    dydb_client = get_client('dynamodb', region)
+    # Hot accounts spread their writes over (AccountId, Shard) items of the sharded tracker table
+    table_name = SHARDED_TRACKER_TABLE if SAVINGS_SHARDS > 1 else LEGACY_TRACKER_TABLE
     
     # Check if the DynamoDB table exists
     try:
@@ -248,28 +357,39 @@ def track_volume_savings(account, size, region):
             logger.error(f"Unexpected error: {e}")
             return None
     
-    # Get the current savings value for the account
-    try:
-        response = table.get_item(Key={'AccountId': account})
-    except ClientError as e:
-        logger.error(f"Error retrieving item: {e}")
+    # Calculate the savings for this volume
+    avg_volume_cost = get_average_volume_cost(region)
+    if avg_volume_cost is None:
+        logger.error(f"Pricing not found for region: {region}")
         return None
+    volume_savings = Decimal(str(size * avg_volume_cost))
     
-    current_savings = response.get('Item', {}).get('TotalSavings', 0)
-    
-    # Calculate new savings
-    # Note: You'll need to implement a function to get the average volume cost for the region
-    avg_volume_cost = get_average_volume_cost(region)  # Implement this function
-    new_savings = current_savings + (size * avg_volume_cost)
-    
-    # Update the item in DynamoDB
+    # Atomically add to the account's total in a single UpdateItem (no get_item round trip)
     try:
-        table.put_item(
-            Item={
-                'AccountId': account,
-                'TotalSavings': new_savings
+        if volume_id is not None:
+            key = {'AccountId': {'S': str(account)}}
+            if SAVINGS_SHARDS > 1:
+                key['Shard'] = {'S': str(pick_shard(SAVINGS_SHARDS))}
+            update = {
+                'TableName': table_name,
+                'Key': key,
+                'UpdateExpression': "ADD TotalSavings :savings",
+                'ExpressionAttributeValues': {':savings': {'N': str(volume_savings)}}
             }
-        )
+            if not apply_once(dydb_client, volume_id, update):
+                logger.info(f"Volume {volume_id} was already counted for account {account}")
+                return Decimal(0)
+            new_savings = volume_savings
+        elif SAVINGS_SHARDS > 1:
+            new_savings = add_sharded_tracker_savings(dydb_client, account, volume_savings, SAVINGS_SHARDS, table_name)
+        else:
+            response = table.update_item(
+                Key={'AccountId': account},
+                UpdateExpression="ADD TotalSavings :savings",
+                ExpressionAttributeValues={':savings': volume_savings},
+                ReturnValues="UPDATED_NEW"
+            )
+            new_savings = response['Attributes']['TotalSavings']
     except ClientError as e:
         logger.error(f"Error updating item: {e}")
         return None
@@ -277,61 +397,96 @@ def track_volume_savings(account, size, region):
     logger.info(f"Updated savings for account {account}: {new_savings}")
     return new_savings
     
-def store_savings(account, volume_size, region, com_pricing, dydb_client, vol_savings_table):
+def store_savings(account, volume_size, region, com_pricing, dydb_client, vol_savings_table, volume_type='gp2', totals=None, volume_id=None):
+    """
+    Add a deleted volume's size and savings to the (Account, Region) savings item.
+
+    When totals is given the volume is only accumulated in memory; call
+    flush_savings(dydb_client, vol_savings_table, totals) once at the end of the run
+    to write one UpdateItem per (account, region) instead of one per volume (store_run_savings
+    does this for a whole run).
+
+    With SAVINGS_SHARDS > 1 the update goes to a random '<region>#<shard>' item and the
+    returned total is that shard's; sharded_savings.get_sharded_savings sums the shards.
+
+    With volume_id the volume is counted exactly once (see savings_ledger.apply_once):
+    retries and replays of the same volume return 0.0 without changing the totals, and
+    the volume's own savings are returned instead of the total. totals and volume_id
+    cannot be combined: the ledger check needs its own transaction per volume.
+    """
+    if totals is not None and volume_id is not None:
+        raise ValueError("store_savings: totals and volume_id cannot be combined")
     try:
-        # Fetch the current size for the tenant (account) using client
-        response = dydb_client.get_item(
-            TableName=vol_savings_table,
-            Key={
-                'Account': {'S': str(account)},  # Convert account to string
-                'Region': {'S': region}          # Sort key region is already a string
-            }
-        )
-        
-        if 'Item' in response:
-            # Previous saved size exists, get the value
-            previous_size = int(response['Item']['Size']['N'])  # Assuming size is stored as a number
-        else:
-            # No previous data, initialize to 0
-            previous_size = 0
-        
-        # Add the current volume size to the previous size
-        total_size = previous_size + int(volume_size)  # Ensure volume_size is treated as an integer
-        
-        # Find the price per GB for the region
-        volume_cost_per_gb = None
-        for pricing in com_pricing:
-            if pricing['location'] == region:
-                volume_cost_per_gb = float(pricing['price_per_unit'])
-                break
+        # Find the price per GB for the region (com_pricing is a price index, see get_govcloud_pricing_info).
+        # Without one, fall back to the pricing snapshot or the offer file.
+        volume_cost_per_gb = get_average_volume_cost(region, volume_type, com_pricing)
         
         if volume_cost_per_gb is None:
             print(f"Pricing not found for region: {region}")
             return None
         
-        # Calculate the savings (total size * cost per GB)
-        savings = total_size * volume_cost_per_gb
+        # Calculate the savings for this volume (size * cost per GB)
+        volume_size = int(volume_size)  # Ensure volume_size is treated as an integer
+        savings = volume_size * volume_cost_per_gb
+
+        if totals is not None:
+            add_savings(totals, account, region, volume_size, savings)
+            return savings
         
-        # Update the table with the new size and savings using put_item
-        dydb_client.put_item(
-            TableName=vol_savings_table,
-            Item={
-                'Account': {'S': str(account)},   # Ensure account is a string
-                'Region': {'S': region},          # Ensure region is a string
-                'Size': {'N': str(total_size)},   # Numbers must be stored as strings in DynamoDB
-                'Savings': {'N': str(savings)}    # Savings as a number
-            }
-        )
+        # Atomically add the size and savings in a single UpdateItem (no get_item round trip)
+        key = savings_key(account, region, 'Region', SAVINGS_SHARDS)
+        if volume_id is not None:
+            if not apply_once(dydb_client, volume_id, savings_update(vol_savings_table, key, volume_size, savings)):
+                print(f"Volume {volume_id} was already counted for account {account}.")
+                return 0.0
+            print(f"Added savings of volume {volume_id} for account {account}: {savings} USD")
+            return savings
+        total_size, total_savings = add_to_savings_item(dydb_client, vol_savings_table, key, volume_size, savings)
         
-        print(f"Updated savings for account {account}: {savings} USD")
-        return savings
+        print(f"Updated savings for account {account}: {total_savings} USD")
+        return total_savings
         
     except dydb_client.exceptions.ClientError as e:
         print(f"Failed to update DynamoDB: {e.response['Error']['Message']}")
         return None
 
+
+
+def store_run_savings(volumes, com_pricing, dydb_client, vol_savings_table):
+    """
+    Store the savings of all volumes deleted in one run.
+
+    Volumes without an ID are summed in memory and written with flush_savings, one
+    UpdateItem per (account, region); volumes with an ID go through the ledger one by
+    one so they are counted exactly once.
+
+    :param volumes: iterable of (account, volume_size, region, volume_type, volume_id)
+                    tuples; volume_id may be None
+    :return: dict {(account, region): total savings stored in the (shard) item}
+    """
+    totals = {}
+    for account, volume_size, region, volume_type, volume_id in volumes:
+        if volume_id is not None:
+            store_savings(account, volume_size, region, com_pricing, dydb_client, vol_savings_table,
+                          volume_type=volume_type, volume_id=volume_id)
+        else:
+            store_savings(account, volume_size, region, com_pricing, dydb_client, vol_savings_table,
+                          volume_type=volume_type, totals=totals)
+    try:
+        return flush_savings(dydb_client, vol_savings_table, totals, 'Region', SAVINGS_SHARDS)
+    except dydb_client.exceptions.ClientError as e:
+        print(f"Failed to update DynamoDB: {e.response['Error']['Message']}")
+        return None
+
     
-def main(aws_access_key_id, aws_secret_access_key, aws_session_token=None):
+@profiled('pricecheck_dyno')
+def main(aws_access_key_id, aws_secret_access_key, aws_session_token=None,
+         gov_aws_access_key_id=None, gov_aws_secret_access_key=None, gov_aws_session_token=None):
+    """
+    Refresh the GovCloud gp2 prices in VolumePricing. The commercial keys query the
+    Pricing API; GovCloud is a separate partition, so the table is written with the
+    GOV_* keys (or the default credential chain when they are not given).
+    """
     try:
         # Create a session for the commercial AWS region (for pricing API calls)
       
@@ -339,45 +494,41 @@ def main(aws_access_key_id, aws_secret_access_key, aws_session_token=None):
         volume_id = generate_random_id()  # Example: 'a8Kz3Nf2'
         account_id = generate_random_id()  # Example: '7jS5X9tB'
             
-        commercial_session = boto3.Session(
-            aws_access_key_id=aws_access_key_id,
-            aws_secret_access_key=aws_secret_access_key,
-            aws_session_token=aws_session_token,
-            region_name='us-east-1'  # Commercial AWS region
-        )
-        pricing_client = commercial_session.client('pricing')
-        # Create a session for GovCloud (for DynamoDB operations)
-        govcloud_session = boto3.Session(
-            aws_access_key_id=aws_access_key_id,
-            aws_secret_access_key=aws_secret_access_key,
-            aws_session_token=aws_session_token,
-            region_name='us-gov-west-1'  # GovCloud region
-        )
+        credentials = {
+            'AccessKeyId': aws_access_key_id,
+            'SecretAccessKey': aws_secret_access_key,
+            'SessionToken': aws_session_token
+        }
+        gov_credentials = {
+            'AccessKeyId': gov_aws_access_key_id,
+            'SecretAccessKey': gov_aws_secret_access_key,
+            'SessionToken': gov_aws_session_token
+        } if gov_aws_access_key_id else None
+        # Shared clients: pricing in the commercial partition, DynamoDB in GovCloud
+        pricing_client = get_client('pricing', 'us-east-1', credentials)
 
-        # Validate the session token before proceeding
-        if not validate_session_token(govcloud_session):
+        # Validate the session token before proceeding (cached until the credentials expire)
+        if not validate_credentials(gov_credentials, 'us-gov-west-1'):
             print("Invalid GovCloud session token. Exiting.")
             return
         
-        dynamodb_client = govcloud_session.client('dynamodb')
+        dynamodb_client = get_client('dynamodb', 'us-gov-west-1', gov_credentials)
         table_name = "VolumePricing"
 
         print("Successfully created pricing client (Commercial) and DynamoDB client (GovCloud).")
 
-        # Query for gp2 volumes without GovCloud filter
+        # gp2 storage filters; the refresh adds a regionCode filter per GovCloud region
         print("\nQuerying for gp2 volumes in the commercial AWS region:")
-        gp2_filters = [
-            {'Type': 'TERM_MATCH', 'Field': 'volumeApiName', 'Value': 'gp2'},
-            {'Type': 'TERM_MATCH', 'Field': 'productFamily', 'Value': 'Storage'}
-        ]
-        gp2_price_list = get_pricing_info(pricing_client, gp2_filters)
+        gp2_filters = pricing_filters(volume_type='gp2')
 
-        # Filter and store GovCloud-specific pricing information from the result
-        print("\nFiltering and storing GovCloud pricing information from gp2 results:")
-        print_and_store_govcloud_pricing_info(gp2_price_list, dynamodb_client, table_name)
+        # Store GovCloud-specific pricing information, skipping the run when the offer version is unchanged
+        print("\nRefreshing GovCloud pricing information from gp2 results:")
+        refresh_govcloud_pricing_info(pricing_client, dynamodb_client, table_name, gp2_filters)
 
     except Exception as e:
         print(f"An error occurred: {str(e)}")
+    finally:
+        emit_metrics('pricecheck_dyno')
 
 if __name__ == "__main__":
     aws_access_key_id = os.environ.get('AWS_ACCESS_KEY_ID')
@@ -392,7 +543,21 @@ if __name__ == "__main__":
         print("Please set AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY.")
         print("If you're using temporary credentials, also set AWS_SESSION_TOKEN.")
         exit(1)
-    
+
+    if not gov_aws_access_key_id or not gov_aws_secret_access_key:
+        print("GovCloud credentials not found in environment variables.")
+        print("Please set GOV_AWS_ACCESS_KEY_ID and GOV_AWS_SECRET_ACCESS_KEY.")
+        exit(1)
+
+    if not gov_aws_session_token:
+        print("GovCloud session token is missing. Please set it to proceed.")
+        exit(1)
+
+    # Validate Commercial session token
+    if not aws_session_token:
+        print("Commercial AWS session token is missing. Please set it to proceed.")
+        exit(1)
     
     print("AWS credentials found in environment variables.")
-    main(aws_access_key_id, aws_secret_access_key, aws_session_token, gov_aws_access_key_id,gov_aws_secret_access_key,gov_aws_session_token)
+    main(aws_access_key_id, aws_secret_access_key, aws_session_token,
+         gov_aws_access_key_id, gov_aws_secret_access_key, gov_aws_session_token)
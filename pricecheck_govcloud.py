@@ -1,10 +1,16 @@
 import boto3
 import json
 import os
-import botocore.vendored.requests as requests
 
 import urllib.request
-import json
+from pricing_api import iter_products_cached, pricing_filters, with_region
+from price_index import GOVCLOUD_REGIONS
+from savings_accumulator import add_savings, add_to_savings_item, flush_savings, savings_key, savings_update
+from savings_ledger import apply_once
+from sharded_savings import SAVINGS_SHARDS
+from pricing_snapshot import get_offer_price, get_pricing_snapshot, snapshot_price
+from client_factory import get_client
+from profiling import profiled
 # import here
 
 def get_volume_price(region, volume_type):
@@ -18,68 +24,52 @@ def get_volume_price(region, volume_type):
     Returns:
     float: Price per GB-month or IOPS, or None if not found
     """
-    base_url = 'https://pricing.us-east-1.amazonaws.com'
-    service_url = f'{base_url}/offers/v1.0/aws/AmazonEC2/current/{region}/index.json'
-    
+    # Prefer the packaged pricing snapshot while it is current, which needs no download or parse
+    snapshot = get_pricing_snapshot()
+    if snapshot is not None:
+        price = snapshot_price(snapshot, region, volume_type)
+        if price is not None:
+            return price
+
     try:
-        with urllib.request.urlopen(service_url) as response:
-            data = json.loads(response.read().decode())
-            products = data.get('products', {})
-            
-            for product in products.values():
-                attributes = product.get('attributes', {})
-                current_volume_type = attributes.get('volumeApiName', attributes.get('volumeType', 'Unknown'))
-                
-                # Handle specific cases where the naming might differ (e.g., IOPS volumes)
-                if volume_type in ['gp2', 'gp3', 'Cold HDD', 'Throughput Optimized HDD', 'Magnetic']:
-                    match = (current_volume_type == volume_type)
-                elif volume_type == 'Provisioned IOPS':
-                    match = (current_volume_type == 'io1' or current_volume_type == 'Provisioned IOPS')
-                else:
-                    match = (current_volume_type == volume_type)
-
-                # Check if the product matches the requested volume type
-                if match:
-                    sku = product['sku']
-                    
-                    # Check if On-Demand pricing is available for the product
-                    if sku in data['terms']['OnDemand']:
-                        on_demand_terms = data['terms']['OnDemand'][sku]
-                        
-                        # Loop through each term to find the correct unit price (GB-month or IOPS)
-                        for term_value in on_demand_terms.values():
-                            price_dimensions = term_value.get('priceDimensions', {})
-                            for dimension_value in price_dimensions.values():
-                                # For IOPS, the unit might be different (e.g., per IOPS-month)
-                                if volume_type == 'Provisioned IOPS':
-                                    if dimension_value.get('unit') == 'IOPS-Mo':
-                                        price = dimension_value['pricePerUnit'].get('USD', 'N/A')
-                                        return float(price)
-                                else:
-                                    # Ensure it's the correct unit of measure (GB-month for others)
-                                    if dimension_value.get('unit') == 'GB-Mo':
-                                        price = dimension_value['pricePerUnit'].get('USD', 'N/A')
-                                        return float(price)
-        
-        # If no matching product is found
-        return None
+        # Stream the offer file, keeping only EBS products and their OnDemand terms.
+        # Constant time lookup in the per-region index, rebuilt only when the offer slice changes
+        # ('Provisioned IOPS' resolves to the io1 IOPS-Mo price). Returns None if not found.
+        return get_offer_price(region, volume_type)
     
     except urllib.error.URLError as e:
         print(f"Error fetching pricing data: {e}")
         return None
 
 
-def get_pricing_info(pricing_client, filters):
-    response = pricing_client.get_products(
-        ServiceCode='AmazonEC2',
-        Filters=filters
-    )
-    print(f"Number of items in PriceList: {len(response['PriceList'])}")
-    return response['PriceList']
+def prefetch_volume_prices(regions):
+    """
+    Download the offer files of all regions concurrently over pooled connections,
+    so the following get_volume_price calls are served from the pricing cache.
+    """
+    from offer_fetch import fetch_region_offers
+
+    for region, result in fetch_region_offers(regions).items():
+        if isinstance(result, Exception):
+            print(f"Error fetching pricing data for {region}: {result}")
+
+
+def get_pricing_info(pricing_client, filters, regions=None):
+    """
+    Yield every decoded price item matching filters, following NextToken across pages.
+    Pages are prefetched on a background thread and identical queries are served from the pricing cache.
+    With regions, one query per region code is sent, so the API only returns those regions.
+    """
+    count = 0
+    queries = [filters] if regions is None else [with_region(filters, region) for region in regions]
+    for query in queries:
+        for price_data in iter_products_cached(pricing_client, query):
+            count += 1
+            yield price_data
+    print(f"Number of items in PriceList: {count}")
 
 def print_govcloud_pricing_info(price_list):
-    for price_item in price_list:
-        price_data = json.loads(price_item)
+    for price_data in price_list:
         attributes = price_data['product']['attributes']
         location = attributes.get('location', 'N/A')
 
@@ -147,25 +137,21 @@ def ensure_table_exists(dydb_client, table_name):
         else:
             print(f"Error describing table: {e}")
 
+@profiled('pricecheck_govcloud')
 def main(aws_access_key_id, aws_secret_access_key, aws_session_token=None):
     try:
-        session = boto3.Session(
-            aws_access_key_id=aws_access_key_id,
-            aws_secret_access_key=aws_secret_access_key,
-            aws_session_token=aws_session_token,
-            region_name='us-east-1'
-        )
-        
-        pricing_client = session.client('pricing')
+        credentials = {
+            'AccessKeyId': aws_access_key_id,
+            'SecretAccessKey': aws_secret_access_key,
+            'SessionToken': aws_session_token
+        }
+        pricing_client = get_client('pricing', 'us-east-1', credentials)
         print("Successfully created pricing client.")
 
-        # Query for gp2 volumes without GovCloud filter
-        print("\nQuerying for gp2 volumes without GovCloud filter:")
-        gp2_filters = [
-            {'Type': 'TERM_MATCH', 'Field': 'volumeApiName', 'Value': 'gp2'},
-            {'Type': 'TERM_MATCH', 'Field': 'productFamily', 'Value': 'Storage'}
-        ]
-        gp2_price_list = get_pricing_info(pricing_client, gp2_filters)
+        # Query for gp2 volumes, filtered to the GovCloud regions by the Pricing API
+        print("\nQuerying for gp2 volumes in the GovCloud regions:")
+        gp2_filters = pricing_filters(volume_type='gp2')
+        gp2_price_list = get_pricing_info(pricing_client, gp2_filters, regions=GOVCLOUD_REGIONS)
 
         # Print GovCloud-specific pricing information from the result
         print("\nFiltering and printing GovCloud pricing information from gp2 results:")
@@ -175,26 +161,26 @@ def main(aws_access_key_id, aws_secret_access_key, aws_session_token=None):
         print(f"An error occurred: {str(e)}")
 
 
-def store_savings(account, volume_size, region, volume_type, dydb_client, vol_savings_table):
+def store_savings(account, volume_size, region, volume_type, dydb_client, vol_savings_table, totals=None, volume_id=None):
+    """
+    Add a deleted volume's size and savings to the (Account, region) savings item.
+
+    When totals is given the volume is only accumulated in memory; call
+    flush_savings(dydb_client, vol_savings_table, totals, region_attribute='region')
+    once at the end of the run to write one UpdateItem per (account, region) (store_run_savings
+    does this for a whole run).
+
+    With SAVINGS_SHARDS > 1 the update goes to a random '<region>#<shard>' item and the
+    returned total is that shard's; sharded_savings.get_sharded_savings sums the shards.
+
+    With volume_id the volume is counted exactly once (see savings_ledger.apply_once):
+    retries and replays of the same volume return 0.0 without changing the totals, and
+    the volume's own savings are returned instead of the total. totals and volume_id
+    cannot be combined: the ledger check needs its own transaction per volume.
+    """
+    if totals is not None and volume_id is not None:
+        raise ValueError("store_savings: totals and volume_id cannot be combined")
     try:
-        # Fetch the current size and savings for the tenant (account) using client
-        response = dydb_client.get_item(
-            TableName=vol_savings_table,
-            Key={
-                'Account': {'S': account},  # Partition key
-                'region': {'S': region}     # Lowercase region key
-            }
-        )
-        
-        if 'Item' in response:
-            # Previous saved size and savings exist, get the values
-            previous_size = int(response['Item']['Size']['N'])  # Convert to int
-            previous_savings = float(response['Item']['Savings']['N'])  # Convert to float
-        else:
-            # No previous data, initialize to 0
-            previous_size = 0
-            previous_savings = 0.0
-        
         # Ensure volume_size is a float or int, in case it's provided as a string
         volume_size = float(volume_size)
 
@@ -208,25 +194,22 @@ def store_savings(account, volume_size, region, volume_type, dydb_client, vol_sa
         
         # Calculate the savings for the current volume size (not cumulative yet)
         current_run_savings = volume_size * volume_cost_per_gb
+
+        if totals is not None:
+            add_savings(totals, account, region, volume_size, current_run_savings)
+            return current_run_savings
         
-        # Update the total size after calculating the savings for the current run
-        total_size = previous_size + volume_size
-        
-        # Add current run savings to the previous total savings
-        total_savings = previous_savings + current_run_savings
+        # Atomically add size and savings to the cumulative totals in a single UpdateItem
+        key = savings_key(account, region, 'region', SAVINGS_SHARDS)  # lowercase region sort key
+        if volume_id is not None:
+            if not apply_once(dydb_client, volume_id, savings_update(vol_savings_table, key, volume_size, current_run_savings)):
+                print(f"Volume {volume_id} was already counted for account {account} in region {region}.")
+                return 0.0
+            print(f"Added savings of volume {volume_id} for account {account} in region {region}: {round(current_run_savings, 2)} USD")
+            return current_run_savings
+        total_size, total_savings = add_to_savings_item(dydb_client, vol_savings_table, key, volume_size, current_run_savings)
         total_savings = round(total_savings, 2)
         
-        # Update the table with the new total size and total cumulative savings using put_item
-        dydb_client.put_item(
-            TableName=vol_savings_table,
-            Item={
-                'Account': {'S': account},   # Partition key
-                'region': {'S': region},      # Lowercase region key
-                'Size': {'N': str(total_size)},    # Total size of deleted volumes
-                'Savings': {'N': str(total_savings)}  # Total cumulative savings
-            }
-        )
-        
         print(f"Updated cumulative savings for account {account} in region {region}: {total_savings} USD")
         return total_savings
         
@@ -238,17 +221,54 @@ def store_savings(account, volume_size, region, volume_type, dydb_client, vol_sa
         return None
 
 
+
+def store_run_savings(volumes, dydb_client, vol_savings_table):
+    """
+    Store the savings of all volumes deleted in one run: volumes without an ID are
+    summed in memory and written with one UpdateItem per (account, region), volumes
+    with an ID go through the ledger one by one.
+
+    :param volumes: iterable of (account, volume_size, region, volume_type, volume_id)
+                    tuples; volume_id may be None
+    :return: dict {(account, region): total savings stored in the (shard) item}
+    """
+    totals = {}
+    for account, volume_size, region, volume_type, volume_id in volumes:
+        if volume_id is not None:
+            store_savings(account, volume_size, region, volume_type, dydb_client, vol_savings_table, volume_id=volume_id)
+        else:
+            store_savings(account, volume_size, region, volume_type, dydb_client, vol_savings_table, totals=totals)
+    try:
+        return flush_savings(dydb_client, vol_savings_table, totals, 'region', SAVINGS_SHARDS)
+    except dydb_client.exceptions.ClientError as e:
+        print(f"Failed to update DynamoDB: {e.response['Error']['Message']}")
+        return None
+
+
 # Example usage
-govcloud_session = boto3.Session()  # Replace with your actual session initialization
-dydb_client = govcloud_session.client('dynamodb')
+_dydb_client = None
+
+def get_dydb_client():
+    """
+    Create the GovCloud DynamoDB client on first use (not at import) and reuse it afterwards.
+    """
+    global _dydb_client
+    if _dydb_client is None:
+        _dydb_client = get_client('dynamodb')  # Default credential chain and region
+    return _dydb_client
+
 vol_savings_table = 'volumesavingtracker'
 
 account = '123456789012'
 volume_size = 50
 region = 'us-east-1'
-com_pricing = {'us-east-1': 0.10}  # Example cost per GB
+com_pricing = {('us-east-1', 'gp2', 'GB-Mo'): 0.10}  # Example price index
 
-# store_savings(account, volume_size, region, com_pricing, dydb_client, vol_savings_table)
+# store_savings(account, volume_size, region, com_pricing, get_dydb_client(), vol_savings_table)
+# A whole run, one UpdateItem per (account, region):
+# store_run_savings([(account, volume_size, region, 'gp2', None)], get_dydb_client(), vol_savings_table)
+# Exactly once per volume, safe to retry (create the ledger once with savings_ledger.ensure_ledger_table):
+# store_savings(account, volume_size, region, 'gp2', get_dydb_client(), vol_savings_table, volume_id='vol-0123456789abcdef0')
 
 
 
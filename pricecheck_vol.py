@@ -1,30 +1,23 @@
-import boto3
-import json
 import os
+from pricing_api import iter_products, pricing_filters
+from client_factory import get_client
+from profiling import profiled
 
+@profiled('pricecheck_vol')
 def get_gp2_pricing(aws_access_key_id, aws_secret_access_key, aws_session_token=None):
-    # Initialize the pricing client with provided credentials
-    session = boto3.Session(
-        aws_access_key_id=aws_access_key_id,
-        aws_secret_access_key=aws_secret_access_key,
-        aws_session_token=aws_session_token,
-        region_name='us-east-1'  # Pricing API is available in us-east-1
-    )
-    
-    pricing_client = session.client('pricing')
+    # Shared pricing client for the provided credentials (Pricing API is available in us-east-1)
+    credentials = {
+        'AccessKeyId': aws_access_key_id,
+        'SecretAccessKey': aws_secret_access_key,
+        'SessionToken': aws_session_token
+    }
+    pricing_client = get_client('pricing', 'us-east-1', credentials)
 
-    # Get the pricing for gp2 volumes
-    response = pricing_client.get_products(
-        ServiceCode='AmazonEC2',
-        Filters=[
-            {'Type': 'TERM_MATCH', 'Field': 'volumeApiName', 'Value': 'gp2'},
-            {'Type': 'TERM_MATCH', 'Field': 'productFamily', 'Value': 'Storage'}
-        ]
-    )
+    # Get the pricing for gp2 volumes, streaming every page of results
+    price_items = iter_products(pricing_client, pricing_filters(volume_type='gp2'), prefetch=2)
 
     # Parse and print the pricing information
-    for price_item in response['PriceList']:
-        price_data = json.loads(price_item)
+    for price_data in price_items:
         
         # Extract relevant information
         location = price_data['product']['attributes']['location']
@@ -0,0 +1,139 @@
+import json
+import queue
+import threading
+
+from pricing_cache import cache_key, is_fresh, read_entry, write_entry
+from run_metrics import phase
+
+
+def term_match(field, value):
+    return {'Type': 'TERM_MATCH', 'Field': field, 'Value': value}
+
+
+def pricing_filters(region=None, volume_type=None, product_family='Storage', **attributes):
+    """
+    Build get_products filters that the Pricing API applies server side, so only
+    the products actually needed are transferred.
+
+    :param region: region code (e.g. 'us-gov-west-1'), matched on the regionCode attribute
+    :param volume_type: volumeApiName (e.g. 'gp2')
+    :param product_family: productFamily, None for any
+    :param attributes: any other attribute=value pairs to match
+    """
+    filters = []
+    if volume_type is not None:
+        filters.append(term_match('volumeApiName', volume_type))
+    if product_family is not None:
+        filters.append(term_match('productFamily', product_family))
+    if region is not None:
+        filters.append(term_match('regionCode', region))
+    filters.extend(term_match(field, value) for field, value in attributes.items())
+    return filters
+
+
+def with_region(filters, region):
+    """
+    Return a copy of filters restricted to one region code.
+    """
+    return [f for f in filters if f['Field'] != 'regionCode'] + [term_match('regionCode', region)]
+
+
+def iter_price_pages(pricing_client, filters, service_code='AmazonEC2'):
+    """
+    Yield every PriceList page of a get_products query, following NextToken.
+    """
+    kwargs = {'ServiceCode': service_code, 'Filters': filters}
+    while True:
+        with phase('fetch'):
+            response = pricing_client.get_products(**kwargs)
+        yield response['PriceList']
+        next_token = response.get('NextToken')
+        if not next_token:
+            return
+        kwargs['NextToken'] = next_token
+
+
+def prefetch_pages(pages, depth=2):
+    """
+    Fetch up to depth pages ahead on a background thread, so parsing one page
+    overlaps the network latency of the next one.
+    The thread stops as soon as the consumer stops iterating.
+    """
+    pages_queue = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                pages_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def worker():
+        try:
+            for page in pages:
+                if not put(page):
+                    return
+        except Exception as e:
+            put(e)
+            return
+        put(done)
+
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = pages_queue.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+def iter_products(pricing_client, filters, service_code='AmazonEC2', prefetch=0):
+    """
+    Yield every decoded price item matching filters, across all pages.
+    Only the current page (plus prefetch pages) is held in memory.
+
+    :param pricing_client: boto3 pricing client
+    :param filters: get_products filters
+    :param service_code: pricing service code
+    :param prefetch: number of pages fetched ahead on a background thread (0 = no thread)
+    """
+    pages = iter_price_pages(pricing_client, filters, service_code)
+    if prefetch:
+        pages = prefetch_pages(pages, prefetch)
+    for page in pages:
+        with phase('parse'):
+            decoded = [json.loads(price_item) for price_item in page]
+        yield from decoded
+
+
+def iter_products_cached(pricing_client, filters, service_code='AmazonEC2', prefetch=2, ttl=None):
+    """
+    Same as iter_products, but served from the pricing cache when a fresh entry exists.
+    A fully consumed query is written to the cache for the next caller.
+    """
+    key = cache_key(service_code, None, filters)
+    entry = read_entry(key)
+    if is_fresh(entry, ttl):
+        for price_item in entry['value']:
+            yield json.loads(price_item)
+        return
+
+    pages = iter_price_pages(pricing_client, filters, service_code)
+    if prefetch:
+        pages = prefetch_pages(pages, prefetch)
+    price_list = []
+    for page in pages:
+        price_list.extend(page)
+        with phase('parse'):
+            decoded = [json.loads(price_item) for price_item in page]
+        yield from decoded
+    write_entry(key, price_list)
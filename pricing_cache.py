@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import time
+
+from run_metrics import CountingReader, phase
+
+# Lambda only allows writes under /tmp, which also survives warm invocations
+PRICING_CACHE_DIR = os.environ.get('PRICING_CACHE_DIR', '/tmp/pricing_cache')
+PRICING_CACHE_TTL = int(os.environ.get('PRICING_CACHE_TTL', 24 * 60 * 60))  # seconds
+PRICING_CACHE_MAX_BYTES = int(os.environ.get('PRICING_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
+# In-process copy of the entries read or written during this container's lifetime
+_memory_cache = {}
+
+
+def cache_key(service, region, filters=None):
+    """
+    Build a stable cache key from (service, region, filters).
+    Filters may be a Pricing API filter list or any JSON serialisable value.
+    """
+    raw = json.dumps([service, region, filters], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _entry_path(key):
+    return os.path.join(PRICING_CACHE_DIR, f"{key}.json")
+
+
+def read_entry(key):
+    """
+    Return the cache entry for key, or None if it is not cached.
+    An entry is a dict: {'value', 'stored_at', 'etag', 'last_modified'}.
+    """
+    entry = _memory_cache.get(key)
+    if entry is not None:
+        return entry
+    try:
+        with open(_entry_path(key)) as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    _memory_cache[key] = entry
+    return entry
+
+
+def write_entry(key, value, etag=None, last_modified=None):
+    """
+    Store a parsed value on disk (atomically) and in memory, then evict old entries.
+    """
+    entry = {'value': value, 'stored_at': time.time(), 'etag': etag, 'last_modified': last_modified}
+    _memory_cache[key] = entry
+    try:
+        os.makedirs(PRICING_CACHE_DIR, exist_ok=True)
+        tmp_path = f"{_entry_path(key)}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, _entry_path(key))
+        evict_entries()
+    except OSError as e:
+        print(f"Error writing pricing cache entry: {e}")
+    return entry
+
+
+def touch_entry(key, entry):
+    """
+    Mark an entry as fresh again (e.g. after a 304 Not Modified response).
+    """
+    return write_entry(key, entry['value'], entry.get('etag'), entry.get('last_modified'))
+
+
+def is_fresh(entry, ttl=None):
+    ttl = PRICING_CACHE_TTL if ttl is None else ttl
+    return entry is not None and time.time() - entry['stored_at'] < ttl
+
+
+def evict_entries(max_bytes=None):
+    """
+    Delete the least recently written entries until the cache fits in max_bytes.
+    """
+    max_bytes = PRICING_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    try:
+        files = [os.path.join(PRICING_CACHE_DIR, name) for name in os.listdir(PRICING_CACHE_DIR) if name.endswith('.json')]
+        stats = sorted(((os.stat(path), path) for path in files), key=lambda item: item[0].st_mtime)
+    except OSError:
+        return
+    total = sum(stat.st_size for stat, _ in stats)
+    for stat, path in stats:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= stat.st_size
+        _memory_cache.pop(os.path.basename(path)[:-len('.json')], None)
+
+
+def get_or_load(key, loader, ttl=None):
+    """
+    Return the cached value for key, calling loader() and caching its result when
+    the entry is missing or older than ttl. Used for Pricing API lookups.
+    """
+    entry = read_entry(key)
+    if is_fresh(entry, ttl):
+        return entry['value']
+    value = loader()
+    write_entry(key, value)
+    return value
+
+
+def fetch_offer_cached(url, parse, key, ttl=None):
+    """
+    Download an offer file and return parse(response), cached under key.
+
+    Fresh entries are returned without any network access. Stale entries are
+    revalidated with If-None-Match / If-Modified-Since, and a 304 response
+    reuses the cached value instead of downloading the file again.
+
+    :param url: offer file URL
+    :param parse: callable(file-like response) -> JSON serialisable value
+    :param key: cache key (see cache_key)
+    :param ttl: seconds an entry is served without revalidation
+    :return: parsed value
+    """
+    entry = read_entry(key)
+    if is_fresh(entry, ttl):
+        return entry['value']
+
+    # Imported on first download only: urllib.request pulls in ssl and http.client
+    import urllib.error
+    import urllib.request
+
+    request = urllib.request.Request(url)
+    if entry is not None:
+        if entry.get('etag'):
+            request.add_header('If-None-Match', entry['etag'])
+        if entry.get('last_modified'):
+            request.add_header('If-Modified-Since', entry['last_modified'])
+
+    try:
+        with phase('fetch'), urllib.request.urlopen(request) as response:
+            value = parse(CountingReader(response))
+            write_entry(key, value, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+            return value
+    except urllib.error.HTTPError as e:
+        if e.code == 304 and entry is not None:
+            return touch_entry(key, entry)['value']
+        raise
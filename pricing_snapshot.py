@@ -0,0 +1,196 @@
+import json
+import os
+import sqlite3
+import sys
+import time
+
+from offer_stream import load_offer_slice
+from price_index import VOLUME_TYPE_ALIASES, build_price_index_from_offer, get_offer_price_index, lookup_price
+from pricing_cache import cache_key, fetch_offer_cached
+
+OFFER_BASE_URL = 'https://pricing.us-east-1.amazonaws.com'
+REGION_INDEX_URL = f'{OFFER_BASE_URL}/offers/v1.0/aws/AmazonEC2/current/region_index.json'
+
+# Snapshot shipped with the Lambda package (override with PRICING_SNAPSHOT_PATH)
+PRICING_SNAPSHOT_PATH = os.environ.get(
+    'PRICING_SNAPSHOT_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pricing_snapshot.db')
+)
+# Snapshots older than this are not used; prices then come from the current offer files
+PRICING_SNAPSHOT_MAX_AGE = int(os.environ.get('PRICING_SNAPSHOT_MAX_AGE_DAYS', 30)) * 24 * 60 * 60
+
+_snapshot = None
+_snapshot_checked = False
+
+
+def load_region_index():
+    """
+    Download the AmazonEC2 region_index.json (a few KB, lists every regional offer file).
+    """
+    import urllib.request
+
+    with urllib.request.urlopen(REGION_INDEX_URL) as response:
+        return json.loads(response.read().decode())
+
+
+def list_offer_regions():
+    """
+    Return every region code listed in the AmazonEC2 region_index.json.
+    """
+    return sorted(load_region_index()['regions'])
+
+
+def get_offer_versions():
+    """
+    Return {region: current offer version}, read from each region's currentVersionUrl
+    (/offers/v1.0/aws/AmazonEC2/<version>/<region>/index.json). This is a single
+    small request, so it is a cheap way to find out whether prices may have changed.
+    """
+    versions = {}
+    for region, region_info in load_region_index()['regions'].items():
+        parts = region_info.get('currentVersionUrl', '').strip('/').split('/')
+        versions[region] = parts[-3] if len(parts) >= 3 else None
+    return versions
+
+
+def build_snapshot(path, regions):
+    """
+    Build a read-only SQLite pricing snapshot with every EBS OnDemand price
+    (all volume types and price dimensions) of the given regions, plus the
+    offer version and publication date of each regional offer file.
+
+    :param path: output file; written to a temporary file and renamed when complete
+    :param regions: region codes to include
+    :return: number of price rows written
+    """
+    tmp_path = f"{path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    conn.executescript("""
+        CREATE TABLE prices (
+            region TEXT NOT NULL,
+            volume_api_name TEXT NOT NULL,
+            unit TEXT NOT NULL,
+            price REAL NOT NULL,
+            PRIMARY KEY (region, volume_api_name, unit)
+        ) WITHOUT ROWID;
+        CREATE TABLE offers (
+            region TEXT PRIMARY KEY,
+            version TEXT,
+            publication_date TEXT
+        ) WITHOUT ROWID;
+        CREATE TABLE meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        ) WITHOUT ROWID;
+    """)
+
+    rows = 0
+    for region in regions:
+        service_url = f'{OFFER_BASE_URL}/offers/v1.0/aws/AmazonEC2/current/{region}/index.json'
+        data = fetch_offer_cached(service_url, load_offer_slice, cache_key('AmazonEC2', region, 'ebs'))
+        index = build_price_index_from_offer(data, region)
+        conn.executemany(
+            "INSERT INTO prices VALUES (?, ?, ?, ?)",
+            [(region_code, volume_api_name, unit, price) for (region_code, volume_api_name, unit), price in index.items()]
+        )
+        conn.execute("INSERT INTO offers VALUES (?, ?, ?)", (region, data.get('version'), data.get('publicationDate')))
+        rows += len(index)
+        print(f"{region}: {len(index)} prices (offer version {data.get('version')})")
+
+    conn.execute("INSERT INTO meta VALUES ('built_at', ?)", (str(int(time.time())),))
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+    os.replace(tmp_path, path)
+    return rows
+
+
+def open_snapshot(path):
+    """
+    Open a snapshot read-only. Pages are memory-mapped and only the pages a
+    lookup touches are ever read, so there is no up-front deserialisation.
+    """
+    conn = sqlite3.connect(f"file:{path}?mode=ro&immutable=1", uri=True, check_same_thread=False)
+    conn.execute(f"PRAGMA mmap_size = {max(os.path.getsize(path), 1)}")
+    return conn
+
+
+def snapshot_built_at(conn):
+    """
+    Return when the snapshot was built (epoch seconds), or None if it is not recorded.
+    """
+    row = conn.execute("SELECT value FROM meta WHERE key = 'built_at'").fetchone()
+    return int(row[0]) if row is not None else None
+
+
+def is_snapshot_stale(conn, max_age=PRICING_SNAPSHOT_MAX_AGE):
+    built_at = snapshot_built_at(conn)
+    return built_at is None or time.time() - built_at > max_age
+
+
+def get_pricing_snapshot():
+    """
+    Return the connection to the packaged snapshot (opened once per container),
+    or None if no snapshot is available or it is older than PRICING_SNAPSHOT_MAX_AGE.
+    Callers fall back to the offer files then (see get_offer_price), so a shipped
+    snapshot never freezes prices for the life of a deployment.
+    """
+    global _snapshot, _snapshot_checked
+    if not _snapshot_checked:
+        # Checked once, so containers without a snapshot don't stat the file on every lookup
+        _snapshot_checked = True
+        if os.path.exists(PRICING_SNAPSHOT_PATH):
+            conn = open_snapshot(PRICING_SNAPSHOT_PATH)
+            if is_snapshot_stale(conn):
+                print(f"Pricing snapshot {PRICING_SNAPSHOT_PATH} is stale, using the current offer files.")
+                conn.close()
+            else:
+                _snapshot = conn
+    return _snapshot
+
+
+def get_offer_price(region, volume_type, unit='GB-Mo'):
+    """
+    Look up one price in the region's current offer file. The EBS slice of the file
+    is cached on disk and revalidated with a conditional GET once stale.
+
+    :return: price per unit as float, or None if not found
+    """
+    service_url = f'{OFFER_BASE_URL}/offers/v1.0/aws/AmazonEC2/current/{region}/index.json'
+    data = fetch_offer_cached(service_url, load_offer_slice, cache_key('AmazonEC2', region, 'ebs'))
+    return lookup_price(get_offer_price_index(data, region), region, volume_type, unit)
+
+
+def snapshot_price(conn, region, volume_type, unit='GB-Mo'):
+    """
+    Look up one price in a snapshot. Accepts the same aliases as price_index.lookup_price.
+
+    :return: price per unit as float, or None if not found
+    """
+    for volume_api_name, alias_unit in VOLUME_TYPE_ALIASES.get(volume_type, [(volume_type, unit)]):
+        row = conn.execute(
+            "SELECT price FROM prices WHERE region = ? AND volume_api_name = ? AND unit = ?",
+            (region, volume_api_name, alias_unit)
+        ).fetchone()
+        if row is not None:
+            return row[0]
+    return None
+
+
+def snapshot_offer_version(conn, region):
+    """
+    Return (version, publication_date) of the offer file a region's prices came from,
+    so callers can compare it with the current offer and detect stale snapshots.
+    """
+    row = conn.execute("SELECT version, publication_date FROM offers WHERE region = ?", (region,)).fetchone()
+    return (row[0], row[1]) if row is not None else (None, None)
+
+
+if __name__ == "__main__":
+    # Usage: python pricing_snapshot.py [output.db] [region ...]
+    output = sys.argv[1] if len(sys.argv) > 1 else PRICING_SNAPSHOT_PATH
+    regions = sys.argv[2:] or list_offer_regions()
+    rows = build_snapshot(output, regions)
+    print(f"Wrote {rows} prices for {len(regions)} regions to {output} ({os.path.getsize(output)} bytes)")
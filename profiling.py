@@ -0,0 +1,109 @@
+import cProfile
+import functools
+import io
+import marshal
+import os
+import pstats
+import time
+import tracemalloc
+
+# Where profiles are written: a local directory or s3://bucket/prefix. Unset turns profiling off.
+# Read once at import, so entry points are left undecorated (no overhead) when it is off.
+PROFILE_OUTPUT = os.environ.get('PROFILE_OUTPUT')
+# Functions and allocation sites listed in the text report
+PROFILE_TOP_N = int(os.environ.get('PROFILE_TOP_N', 30))
+# Frames kept per allocation traceback
+PROFILE_TRACE_FRAMES = int(os.environ.get('PROFILE_TRACE_FRAMES', 1))
+
+
+def _write_output(destination, name, data):
+    """
+    Write data (bytes) to destination/name, uploading to S3 for s3:// destinations.
+
+    :return: location written to
+    """
+    if destination.startswith('s3://'):
+        from client_factory import get_client
+
+        bucket, _, prefix = destination[len('s3://'):].partition('/')
+        key = f"{prefix.rstrip('/')}/{name}" if prefix else name
+        get_client('s3').put_object(Bucket=bucket, Key=key, Body=data)
+        return f"s3://{bucket}/{key}"
+    os.makedirs(destination, exist_ok=True)
+    path = os.path.join(destination, name)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+def _dump_stats(profile):
+    # pstats.Stats.dump_stats only writes to a path; marshal the same data for S3 uploads
+    return marshal.dumps(profile.stats)
+
+
+def profile_report(run_name, profile, snapshot, peak, seconds, top_n=PROFILE_TOP_N):
+    """
+    Build the text report of a profiled run: the top functions by cumulative time
+    and the allocation sites holding the most memory when the run ended.
+    """
+    out = io.StringIO()
+    out.write(f"Profile of {run_name}: {seconds:.3f}s wall, peak traced memory {peak / (1024 * 1024):.1f} MB\n\n")
+    out.write(f"Top {top_n} functions by cumulative time (calling thread only):\n")
+    pstats.Stats(profile, stream=out).sort_stats('cumulative').print_stats(top_n)
+    out.write(f"\nTop {top_n} allocation sites still allocated at the end of the run (all threads):\n")
+    for stat in snapshot.statistics('lineno')[:top_n]:
+        out.write(f"{stat.size / 1024:>12.1f} KiB {stat.count:>9} blocks  {stat.traceback}\n")
+    return out.getvalue()
+
+
+def write_profile(run_name, profile, snapshot, peak, seconds, destination):
+    """
+    Write <run>-<timestamp>.prof (pstats format, e.g. for snakeviz) and the matching
+    -report.txt to destination. Failures are printed and never fail the profiled run.
+    """
+    name = f"{run_name}-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+    try:
+        profile.create_stats()
+        written = [
+            _write_output(destination, f"{name}.prof", _dump_stats(profile)),
+            _write_output(destination, f"{name}-report.txt",
+                          profile_report(run_name, profile, snapshot, peak, seconds).encode()),
+        ]
+        print(f"Profile of {run_name} written to {', '.join(written)}")
+    except Exception as e:
+        print(f"Error writing profile of {run_name}: {e}")
+
+
+def profiled(run_name, destination=PROFILE_OUTPUT):
+    """
+    Decorator that runs the function under cProfile and tracemalloc and writes the
+    profile and a top-allocations report to destination (PROFILE_OUTPUT by default).
+    Without a destination the function is returned unchanged.
+
+    cProfile covers the calling thread; work of pool threads shows up as time spent waiting.
+    """
+    def decorate(func):
+        if not destination:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started_tracing = not tracemalloc.is_tracing()
+            if started_tracing:
+                tracemalloc.start(PROFILE_TRACE_FRAMES)
+            tracemalloc.reset_peak()
+            profile = cProfile.Profile()
+            start = time.perf_counter()
+            profile.enable()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.disable()
+                seconds = time.perf_counter() - start
+                snapshot = tracemalloc.take_snapshot()
+                peak = tracemalloc.get_traced_memory()[1]
+                if started_tracing:
+                    tracemalloc.stop()
+                write_profile(run_name, profile, snapshot, peak, seconds, destination)
+        return wrapper
+    return decorate
@@ -0,0 +1,187 @@
+import os
+import threading
+import time
+
+from botocore.config import Config
+
+# botocore retries with exponential backoff; the token buckets below pace every attempt
+RETRY_CONFIG = Config(retries={'mode': 'standard', 'max_attempts': int(os.environ.get('AWS_MAX_ATTEMPTS', 10))})
+
+# Starting rates (requests or written items per second) and burst sizes, per service.
+# None starts the bucket unthrottled: DynamoDB tables (on-demand ones in particular) are
+# written as fast as they accept until the first throttle response, unless DYNAMODB_TABLE_RATE
+# pins a starting rate.
+INITIAL_RATES = {
+    'pricing': float(os.environ.get('PRICING_API_RATE', 5)),
+    'dynamodb': float(os.environ['DYNAMODB_TABLE_RATE']) if os.environ.get('DYNAMODB_TABLE_RATE') else None,
+}
+BURST_SIZES = {'pricing': 5, 'dynamodb': 50}
+MIN_RATE = 0.5
+MAX_RATE = 1000.0
+# Rate added per token of each successful call that had to wait for tokens
+# (additive increase, halved on throttles)
+RATE_STEP = float(os.environ.get('RATE_LIMIT_STEP', 0.1))
+
+THROTTLE_ERROR_CODES = (
+    'Throttling', 'ThrottlingException', 'ThrottledException', 'RequestLimitExceeded',
+    'TooManyRequestsException', 'ProvisionedThroughputExceededException', 'RequestThrottled',
+)
+
+
+class TokenBucket:
+    """
+    Token bucket whose rate adapts to throttling: halved on every throttle
+    response, raised by RATE_STEP per token after each success of a call that had
+    to wait for tokens. Calls that never wait do not raise the rate, so it only
+    grows while the bucket is the bottleneck.
+
+    A bucket created with rate None does not throttle and only measures its
+    throughput; the first throttle response starts pacing at half the measured
+    rate. Such a bucket turns unthrottled again once its rate climbs past MAX_RATE.
+    """
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.unthrottled_start = rate is None
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+        self.waited = False  # a caller waited for tokens since the last rate increase
+        # Throughput measured while unthrottled: tokens of the current window and last full window's rate
+        self.window_start = self.updated
+        self.window_tokens = 0.0
+        self.measured_rate = 0.0
+
+    def _measure(self, cost, now):
+        if now - self.window_start >= 1.0:
+            self.measured_rate = self.window_tokens / (now - self.window_start)
+            self.window_start, self.window_tokens = now, 0.0
+        self.window_tokens += cost
+
+    def acquire(self, cost=1):
+        """
+        Block until cost tokens are available. Costs above the burst size are capped.
+        """
+        cost = min(cost, self.burst)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if self.rate is None:
+                    self._measure(cost, now)
+                    return
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= cost:
+                    self.tokens -= cost
+                    return
+                wait = (cost - self.tokens) / self.rate
+                self.waited = True
+            time.sleep(wait)
+
+    def on_throttle(self):
+        with self.lock:
+            if self.rate is None:
+                now = time.monotonic()
+                current = self.window_tokens / max(now - self.window_start, 1e-3)
+                self.rate = min(MAX_RATE, max(self.measured_rate, current))
+                self.updated = now
+            self.rate = max(MIN_RATE, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0)
+
+    def on_success(self, cost=1):
+        with self.lock:
+            if self.rate is None or not self.waited:
+                return
+            self.waited = False
+            self.rate += RATE_STEP * min(cost, self.burst)
+            if self.rate > MAX_RATE:
+                if self.unthrottled_start:
+                    self.rate = None
+                    self.window_start, self.window_tokens = time.monotonic(), 0.0
+                else:
+                    self.rate = MAX_RATE
+
+
+# One bucket per (service, table) shared by every client and thread in the process
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def get_bucket(service, resource=None):
+    key = (service, resource)
+    bucket = _buckets.get(key)
+    if bucket is None:
+        with _buckets_lock:
+            bucket = _buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(INITIAL_RATES.get(service, 10.0), BURST_SIZES.get(service, 10))  # None: unthrottled
+                _buckets[key] = bucket
+    return bucket
+
+
+def _request_cost(params):
+    """
+    Return (table name, cost) of a DynamoDB request; batch writes cost one token per item.
+    """
+    if 'TableName' in params:
+        return params['TableName'], 1
+    request_items = params.get('RequestItems') or {}
+    for table_name, requests in request_items.items():
+        return table_name, len(requests)
+    transact_items = params.get('TransactItems') or []
+    for item in transact_items:
+        for action in item.values():
+            return action.get('TableName'), len(transact_items)
+    return None, 1
+
+
+def _before_call(params, model, context, **kwargs):
+    service = model.service_model.service_id.hyphenize()
+    resource, cost = _request_cost(params) if service == 'dynamodb' else (None, 1)
+    bucket = get_bucket(service, resource)
+    context['rate_limit'] = (bucket, cost)
+    bucket.acquire(cost)
+
+
+def _needs_retry(response, request_dict, **kwargs):
+    # Called after every attempt; pace retries of throttled calls through the bucket too
+    if response is None or request_dict is None:
+        return None
+    parsed = response[1]
+    code = parsed.get('Error', {}).get('Code') if isinstance(parsed, dict) else None
+    rate_limit = request_dict.get('context', {}).get('rate_limit')
+    if code in THROTTLE_ERROR_CODES and rate_limit is not None:
+        bucket, cost = rate_limit
+        bucket.on_throttle()
+        bucket.acquire(cost)
+    return None
+
+
+def _after_call(parsed, context, **kwargs):
+    rate_limit = context.get('rate_limit')
+    if rate_limit is None:
+        return
+    # after-call is also emitted for the final error response, before botocore raises it;
+    # throttles were already counted by _needs_retry
+    if isinstance(parsed, dict) and 'Error' in parsed:
+        return
+    # Unprocessed batch items are DynamoDB's way of throttling a BatchWriteItem
+    if isinstance(parsed, dict) and parsed.get('UnprocessedItems'):
+        rate_limit[0].on_throttle()
+    else:
+        rate_limit[0].on_success(rate_limit[1])
+
+
+def rate_limit_client(client):
+    """
+    Route every call of a boto3 client through the shared token bucket of its
+    service (and table, for DynamoDB). Create clients with config=RETRY_CONFIG
+    so throttled calls are retried instead of failing. Returns the client.
+    """
+    # unique_id makes rate limiting the same client twice a no-op
+    events = client.meta.events
+    service = client.meta.service_model.service_id.hyphenize()
+    events.register(f"before-parameter-build.{service}", _before_call, unique_id=f"rate_limiter-before.{service}")
+    events.register(f"needs-retry.{service}", _needs_retry, unique_id=f"rate_limiter-retry.{service}")
+    events.register(f"after-call.{service}", _after_call, unique_id=f"rate_limiter-after.{service}")
+    return client
@@ -0,0 +1,144 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+METRICS_NAMESPACE = 'VolumePricing'
+
+# DynamoDB write operations that get ReturnConsumedCapacity=TOTAL injected
+DYNAMODB_WRITE_OPERATIONS = ('PutItem', 'UpdateItem', 'DeleteItem', 'BatchWriteItem', 'TransactWriteItems')
+
+# Metrics of the current run; updated from worker threads, so every update takes the lock
+_metrics = {'phases': {}, 'calls': {}, 'bytes_downloaded': 0, 'consumed_capacity': 0.0}
+_lock = threading.Lock()
+# Callables(name, seconds) that also receive every single phase duration, e.g. for latency percentiles
+_phase_listeners = []
+
+
+def reset_metrics():
+    with _lock:
+        _metrics['phases'] = {}
+        _metrics['calls'] = {}
+        _metrics['bytes_downloaded'] = 0
+        _metrics['consumed_capacity'] = 0.0
+
+
+@contextmanager
+def phase(name):
+    """
+    Add the wall time of the block to the named phase (fetch, parse, price_resolve, dynamodb_write).
+    Phases running on several threads add up, so a phase can exceed the run's wall time.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _lock:
+            _metrics['phases'][name] = _metrics['phases'].get(name, 0.0) + elapsed
+        for listener in _phase_listeners:
+            listener(name, elapsed)
+
+
+def add_phase_listener(listener):
+    """
+    Call listener(name, seconds) after every phase block; listeners run on the thread of the phase.
+    """
+    _phase_listeners.append(listener)
+
+
+def remove_phase_listener(listener):
+    _phase_listeners.remove(listener)
+
+
+def count_call(name, n=1):
+    with _lock:
+        _metrics['calls'][name] = _metrics['calls'].get(name, 0) + n
+
+
+def add_bytes_downloaded(n):
+    with _lock:
+        _metrics['bytes_downloaded'] += n
+
+
+def record_consumed_capacity(consumed):
+    """
+    Add the CapacityUnits of a ConsumedCapacity response field (a dict, or a list for batch calls).
+    """
+    entries = consumed if isinstance(consumed, list) else [consumed]
+    units = sum(entry.get('CapacityUnits', 0) for entry in entries if entry)
+    with _lock:
+        _metrics['consumed_capacity'] += units
+
+
+class CountingReader:
+    """
+    Wrap a binary stream so every byte read from it is added to bytes_downloaded.
+    """
+    def __init__(self, stream):
+        self.stream = stream
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        add_bytes_downloaded(len(data))
+        return data
+
+
+def _request_consumed_capacity(params, **kwargs):
+    params.setdefault('ReturnConsumedCapacity', 'TOTAL')
+
+
+def _after_call(parsed, event_name, **kwargs):
+    # event_name looks like after-call.<service>.<Operation>
+    _, service, operation = event_name.split('.', 2)
+    count_call(f"{service}.{operation}")
+    if isinstance(parsed, dict) and parsed.get('ConsumedCapacity'):
+        record_consumed_capacity(parsed['ConsumedCapacity'])
+
+
+def instrument_client(client):
+    """
+    Count every API call made with a boto3 client and, for DynamoDB, request and
+    record the consumed capacity of every write. Returns the client.
+    """
+    # unique_id makes instrumenting the same client twice a no-op
+    events = client.meta.events
+    service = client.meta.service_model.service_id.hyphenize()
+    if service == 'dynamodb':
+        for operation in DYNAMODB_WRITE_OPERATIONS:
+            event = f"before-parameter-build.dynamodb.{operation}"
+            events.register(event, _request_consumed_capacity, unique_id=f"run_metrics-{event}")
+    events.register(f"after-call.{service}", _after_call, unique_id=f"run_metrics-after-call.{service}")
+    return client
+
+
+def emit_metrics(run_name):
+    """
+    Print the run's metrics as one CloudWatch Embedded Metric Format line and reset them.
+    CloudWatch Logs turns the line into metrics; it stays readable as JSON in the log.
+    """
+    with _lock:
+        phases = dict(_metrics['phases'])
+        calls = dict(_metrics['calls'])
+        bytes_downloaded = _metrics['bytes_downloaded']
+        consumed_capacity = _metrics['consumed_capacity']
+
+    record = {'Run': run_name}
+    metric_definitions = []
+    for name, seconds in phases.items():
+        record[f"{name}_ms"] = round(seconds * 1000, 3)
+        metric_definitions.append({'Name': f"{name}_ms", 'Unit': 'Milliseconds'})
+    for name, calls_made in calls.items():
+        record[f"{name}_calls"] = calls_made
+        metric_definitions.append({'Name': f"{name}_calls", 'Unit': 'Count'})
+    record['bytes_downloaded'] = bytes_downloaded
+    record['consumed_capacity_units'] = consumed_capacity
+    metric_definitions.append({'Name': 'bytes_downloaded', 'Unit': 'Bytes'})
+    metric_definitions.append({'Name': 'consumed_capacity_units', 'Unit': 'Count'})
+    record['_aws'] = {
+        'Timestamp': int(time.time() * 1000),
+        'CloudWatchMetrics': [{'Namespace': METRICS_NAMESPACE, 'Dimensions': [['Run']], 'Metrics': metric_definitions}]
+    }
+    print(json.dumps(record))
+    reset_metrics()
+    return record
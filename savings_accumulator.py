@@ -0,0 +1,74 @@
+import random
+
+# Size is a DynamoDB reserved word, so attribute names go through placeholders
+ADD_SAVINGS_EXPRESSION = "ADD #size :size, #savings :savings"
+ADD_SAVINGS_NAMES = {'#size': 'Size', '#savings': 'Savings'}
+
+
+def add_savings(totals, account, region, size, savings):
+    """
+    Accumulate one volume's size and savings in memory under (account, region).
+    """
+    entry = totals.setdefault((str(account), region), [0, 0.0])
+    entry[0] += size
+    entry[1] += savings
+    return entry
+
+
+def savings_key(account, region, region_attribute='Region', shards=1):
+    """
+    Build the client-format key of a savings item. With shards > 1 the region sort key
+    gets a random '#<shard>' suffix, spreading an account's writes over several items
+    (see sharded_savings).
+    """
+    if shards > 1:
+        region = f"{region}#{random.randrange(shards)}"
+    return {'Account': {'S': str(account)}, region_attribute: {'S': region}}
+
+
+def savings_update(table_name, key, size, savings):
+    """
+    UpdateItem parameters adding size and savings to one savings item; also usable
+    as a TransactWriteItems 'Update' action (see savings_ledger.apply_once).
+    """
+    return {
+        'TableName': table_name,
+        'Key': key,
+        'UpdateExpression': ADD_SAVINGS_EXPRESSION,
+        'ExpressionAttributeNames': ADD_SAVINGS_NAMES,
+        'ExpressionAttributeValues': {
+            ':size': {'N': str(size)},
+            ':savings': {'N': str(savings)}
+        }
+    }
+
+
+def add_to_savings_item(dydb_client, table_name, key, size, savings):
+    """
+    Atomically add size and savings to one savings item with a single UpdateItem ADD.
+    Missing items are created, so there is no read-modify-write race between workers.
+
+    :param key: item key in client format, e.g. {'Account': {'S': ...}, 'Region': {'S': ...}}
+    :return: (total size, total savings) after the update
+    """
+    response = dydb_client.update_item(ReturnValues="UPDATED_NEW", **savings_update(table_name, key, size, savings))
+    attributes = response['Attributes']
+    return float(attributes['Size']['N']), float(attributes['Savings']['N'])
+
+
+def flush_savings(dydb_client, table_name, totals, region_attribute='Region', shards=1):
+    """
+    Write the per-run totals built with add_savings, one UpdateItem per (account, region).
+
+    :param totals: dict {(account, region): [size, savings]}
+    :param region_attribute: name of the table's region sort key ('Region' or 'region')
+    :param shards: number of shard items per (account, region); 1 keeps the single-item layout
+    :return: dict {(account, region): total savings stored in the (shard) item}
+    """
+    stored = {}
+    for (account, region), (size, savings) in list(totals.items()):
+        key = savings_key(account, region, region_attribute, shards)
+        stored[(account, region)] = add_to_savings_item(dydb_client, table_name, key, size, savings)[1]
+        # Drop flushed keys one by one so a retry after an error never adds them twice
+        del totals[(account, region)]
+    return stored
@@ -0,0 +1,73 @@
+import os
+import time
+
+# One marker item per (VolumeId, counter table) that has already been counted
+LEDGER_TABLE = os.environ.get('SAVINGS_LEDGER_TABLE', 'SavingsLedger')
+# Markers expire through DynamoDB TTL long after any retry or replay could arrive
+LEDGER_RETENTION_SECONDS = int(os.environ.get('SAVINGS_LEDGER_RETENTION_DAYS', 400)) * 24 * 60 * 60
+
+
+def ensure_ledger_table(dydb_client, table_name=LEDGER_TABLE):
+    try:
+        dydb_client.describe_table(TableName=table_name)
+    except dydb_client.exceptions.ResourceNotFoundException:
+        print(f"Table {table_name} does not exist. Creating...")
+        dydb_client.create_table(
+            TableName=table_name,
+            KeySchema=[
+                {'AttributeName': 'VolumeId', 'KeyType': 'HASH'},
+                {'AttributeName': 'Counter', 'KeyType': 'RANGE'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'VolumeId', 'AttributeType': 'S'},
+                {'AttributeName': 'Counter', 'AttributeType': 'S'}
+            ],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        dydb_client.get_waiter('table_exists').wait(TableName=table_name)
+        dydb_client.update_time_to_live(
+            TableName=table_name,
+            TimeToLiveSpecification={'Enabled': True, 'AttributeName': 'ExpiresAt'}
+        )
+        print(f"Table {table_name} created successfully.")
+
+
+def apply_once(dydb_client, volume_id, update, ledger_table=LEDGER_TABLE):
+    """
+    Apply a counter update exactly once per volume: the update and a conditional
+    put of the volume's ledger marker run in one transaction, so a retried, replayed
+    or concurrent call for the same volume changes nothing.
+
+    :param volume_id: EBS volume ID the update accounts for
+    :param update: TransactWriteItems 'Update' action (TableName, Key, UpdateExpression, ...)
+    :return: True if the update was applied, False if the volume was already counted
+    """
+    marker = {
+        'VolumeId': {'S': str(volume_id)},
+        'Counter': {'S': update['TableName']},
+        'CountedAt': {'N': str(int(time.time()))},
+        'ExpiresAt': {'N': str(int(time.time()) + LEDGER_RETENTION_SECONDS)}
+    }
+    try:
+        dydb_client.transact_write_items(TransactItems=[
+            {'Put': {
+                'TableName': ledger_table,
+                'Item': marker,
+                'ConditionExpression': "attribute_not_exists(VolumeId)"
+            }},
+            {'Update': update}
+        ])
+    except dydb_client.exceptions.TransactionCanceledException as e:
+        reasons = e.response.get('CancellationReasons') or [{}]
+        if reasons[0].get('Code') == 'ConditionalCheckFailed':
+            return False
+        raise
+    return True
+
+
+def is_counted(dydb_client, volume_id, counter_table, ledger_table=LEDGER_TABLE):
+    response = dydb_client.get_item(
+        TableName=ledger_table,
+        Key={'VolumeId': {'S': str(volume_id)}, 'Counter': {'S': counter_table}}
+    )
+    return 'Item' in response
@@ -0,0 +1,106 @@
+import os
+
+ROLLUP_TABLE = os.environ.get('ROLLUP_TABLE', 'VolumeSavingsRollups')
+
+# BatchGetItem accepts at most 100 keys per call
+BATCH_GET_LIMIT = 100
+
+
+def rollup_key(account, region=None, month=None):
+    """
+    Key of one rollup item: 'ACCOUNT#<account>', optionally narrowed to a region
+    ('#REGION#<region>') or a month ('#MONTH#<yyyy-mm>').
+    """
+    key = f"ACCOUNT#{account}"
+    if region is not None:
+        key += f"#REGION#{region}"
+    if month is not None:
+        key += f"#MONTH#{month}"
+    return key
+
+
+def add_to_rollups(rollups, account, region, month, savings, volumes=1):
+    """
+    Accumulate one volume's savings in memory under its account, account+region
+    and account+month rollup keys. Negative savings and volumes take back a
+    previously booked row, so a changed row can be booked as its delta.
+
+    :param rollups: dict {rollup key: [volumes, savings]}
+    :param month: 'yyyy-mm' the savings are booked in
+    """
+    for key in (rollup_key(account), rollup_key(account, region=region), rollup_key(account, month=month)):
+        entry = rollups.setdefault(key, [0, 0.0])
+        entry[0] += volumes
+        entry[1] += savings
+
+
+def ensure_rollup_table(dydb_client, table_name=ROLLUP_TABLE):
+    try:
+        dydb_client.describe_table(TableName=table_name)
+    except dydb_client.exceptions.ResourceNotFoundException:
+        print(f"Table {table_name} does not exist. Creating...")
+        dydb_client.create_table(
+            TableName=table_name,
+            KeySchema=[{'AttributeName': 'RollupKey', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': 'RollupKey', 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        dydb_client.get_waiter('table_exists').wait(TableName=table_name)
+        print(f"Table {table_name} created successfully.")
+
+
+def flush_rollups(dydb_client, rollups, table_name=ROLLUP_TABLE):
+    """
+    Add the accumulated rollups to the rollup table, one UpdateItem ADD per key.
+    Flushed keys are dropped one by one so a retry after an error never adds them twice.
+
+    :return: number of rollup items updated
+    """
+    updated = 0
+    for key, (volumes, savings) in list(rollups.items()):
+        if not volumes and not savings:  # Deltas that cancel out, e.g. an unchanged volume
+            del rollups[key]
+            continue
+        dydb_client.update_item(
+            TableName=table_name,
+            Key={'RollupKey': {'S': key}},
+            UpdateExpression="ADD Volumes :volumes, Savings :savings",
+            ExpressionAttributeValues={
+                ':volumes': {'N': str(volumes)},
+                ':savings': {'N': str(savings)}
+            }
+        )
+        del rollups[key]
+        updated += 1
+    return updated
+
+
+def get_rollup(dydb_client, account, region=None, month=None, table_name=ROLLUP_TABLE):
+    """
+    Read one rollup with a single GetItem.
+
+    :return: (volumes, savings), (0, 0.0) when nothing was recorded
+    """
+    response = dydb_client.get_item(TableName=table_name, Key={'RollupKey': {'S': rollup_key(account, region, month)}})
+    item = response.get('Item', {})
+    return int(item.get('Volumes', {}).get('N', 0)), float(item.get('Savings', {}).get('N', 0))
+
+
+def get_rollups(dydb_client, keys, table_name=ROLLUP_TABLE):
+    """
+    Read several rollups (e.g. the three months of a quarter) with BatchGetItem.
+
+    :param keys: rollup keys, see rollup_key
+    :return: dict {rollup key: (volumes, savings)} for every requested key
+    """
+    results = {key: (0, 0.0) for key in keys}
+    keys = list(results)
+    for start in range(0, len(keys), BATCH_GET_LIMIT):
+        request = {table_name: {'Keys': [{'RollupKey': {'S': key}} for key in keys[start:start + BATCH_GET_LIMIT]]}}
+        while request:
+            response = dydb_client.batch_get_item(RequestItems=request)
+            for item in response.get('Responses', {}).get(table_name, []):
+                results[item['RollupKey']['S']] = (int(item.get('Volumes', {}).get('N', 0)),
+                                                   float(item.get('Savings', {}).get('N', 0)))
+            request = response.get('UnprocessedKeys') or {}
+    return results
@@ -0,0 +1,231 @@
+import argparse
+import os
+import random
+
+
+# Number of shard items per account; 1 keeps the single-item layout
+SAVINGS_SHARDS = int(os.environ.get('SAVINGS_SHARDS', 1))
+SHARDED_TRACKER_TABLE = os.environ.get('SHARDED_TRACKER_TABLE', 'VolumesSavingsTrackerSharded')
+# Single-item tracker table written before sharding
+LEGACY_TRACKER_TABLE = 'VolumesSavingsTracker'
+
+
+def pick_shard(shards=None):
+    return random.randrange(shards or SAVINGS_SHARDS)
+
+
+# ---- (Account, Region) savings table: the shard number is appended to the region sort key ----
+
+def get_sharded_savings(dydb_client, table_name, account, region=None, region_attribute='Region'):
+    """
+    Sum the shard items of an account (optionally of one region) with a single Query.
+    Rows written before sharding ('<region>' without a shard suffix) are included,
+    so totals stay complete until migrate_savings_to_shards has run.
+
+    :return: (total size, total savings)
+    """
+    kwargs = {
+        'TableName': table_name,
+        'KeyConditionExpression': "Account = :account",
+        'ExpressionAttributeValues': {':account': {'S': str(account)}},
+        'ProjectionExpression': "#size, Savings, #region",
+        'ExpressionAttributeNames': {'#size': 'Size', '#region': region_attribute}
+    }
+    if region is not None:
+        # '<region>' sorts right before '<region>#<shard>'; other regions in the range are skipped below
+        kwargs['KeyConditionExpression'] += " AND #region BETWEEN :region AND :last_shard"
+        kwargs['ExpressionAttributeValues'][':region'] = {'S': region}
+        kwargs['ExpressionAttributeValues'][':last_shard'] = {'S': f"{region}#\uffff"}
+
+    total_size, total_savings = 0.0, 0.0
+    while True:
+        response = dydb_client.query(**kwargs)
+        for item in response.get('Items', []):
+            item_region = item[region_attribute]['S']
+            if region is not None and item_region != region and not item_region.startswith(f"{region}#"):
+                continue
+            total_size += float(item.get('Size', {}).get('N', 0))
+            total_savings += float(item.get('Savings', {}).get('N', 0))
+        if 'LastEvaluatedKey' not in response:
+            return total_size, total_savings
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def migrate_savings_to_shards(dydb_client, table_name, region_attribute='Region'):
+    """
+    Move existing single-item rows (Account, '<region>') into shard 0 (Account, '<region>#0').
+    Each row is moved in a transaction that only deletes it if it did not change in
+    the meantime, so the migration can run while writers are active and can be re-run.
+
+    :return: number of rows migrated
+    """
+    migrated = 0
+    kwargs = {'TableName': table_name}
+    while True:
+        response = dydb_client.scan(**kwargs)
+        for item in response.get('Items', []):
+            region = item[region_attribute]['S']
+            if '#' in region:
+                continue  # already sharded
+            size = item.get('Size', {'N': '0'})
+            savings = item.get('Savings', {'N': '0'})
+            try:
+                dydb_client.transact_write_items(TransactItems=[
+                    {'Update': {
+                        'TableName': table_name,
+                        'Key': {'Account': item['Account'], region_attribute: {'S': f"{region}#0"}},
+                        'UpdateExpression': "ADD #size :size, Savings :savings",
+                        'ExpressionAttributeNames': {'#size': 'Size'},
+                        'ExpressionAttributeValues': {':size': size, ':savings': savings}
+                    }},
+                    {'Delete': {
+                        'TableName': table_name,
+                        'Key': {'Account': item['Account'], region_attribute: item[region_attribute]},
+                        'ConditionExpression': "#size = :size AND Savings = :savings",
+                        'ExpressionAttributeNames': {'#size': 'Size'},
+                        'ExpressionAttributeValues': {':size': size, ':savings': savings}
+                    }}
+                ])
+                migrated += 1
+            except dydb_client.exceptions.TransactionCanceledException:
+                print(f"Row {item['Account']['S']}/{region} changed during migration, run the migration again.")
+        if 'LastEvaluatedKey' not in response:
+            break
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    print(f"Migrated {migrated} savings rows of {table_name} to shard items.")
+    return migrated
+
+
+# ---- Savings tracker: (AccountId, Shard) items in a table with a Shard sort key ----
+
+def ensure_sharded_tracker_table(dydb_client, table_name=SHARDED_TRACKER_TABLE):
+    try:
+        dydb_client.describe_table(TableName=table_name)
+    except dydb_client.exceptions.ResourceNotFoundException:
+        print(f"Table {table_name} does not exist. Creating...")
+        dydb_client.create_table(
+            TableName=table_name,
+            KeySchema=[
+                {'AttributeName': 'AccountId', 'KeyType': 'HASH'},
+                {'AttributeName': 'Shard', 'KeyType': 'RANGE'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'AccountId', 'AttributeType': 'S'},
+                {'AttributeName': 'Shard', 'AttributeType': 'S'}
+            ],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        dydb_client.get_waiter('table_exists').wait(TableName=table_name)
+        print(f"Table {table_name} created successfully.")
+
+
+def add_sharded_tracker_savings(dydb_client, account, savings, shards=None, table_name=SHARDED_TRACKER_TABLE):
+    """
+    Add savings to one randomly picked tracker shard of the account.
+
+    :return: TotalSavings of the shard item after the update
+    """
+    response = dydb_client.update_item(
+        TableName=table_name,
+        Key={'AccountId': {'S': str(account)}, 'Shard': {'S': str(pick_shard(shards))}},
+        UpdateExpression="ADD TotalSavings :savings",
+        ExpressionAttributeValues={':savings': {'N': str(savings)}},
+        ReturnValues="UPDATED_NEW"
+    )
+    return float(response['Attributes']['TotalSavings']['N'])
+
+
+def get_tracker_savings(dydb_client, account, table_name=SHARDED_TRACKER_TABLE, legacy_table=LEGACY_TRACKER_TABLE):
+    """
+    Sum all tracker shards of an account with a single Query, plus the account's
+    single-item row in legacy_table, so totals written before sharding stay complete
+    until migrate_tracker_to_shards has run. A read racing the migration of the same
+    account can count the moved row twice or not at all; re-read after the migration.
+
+    :param legacy_table: unsharded tracker table; None skips it
+    """
+    total = 0.0
+    if legacy_table:
+        try:
+            response = dydb_client.get_item(
+                TableName=legacy_table,
+                Key={'AccountId': {'S': str(account)}},
+                ProjectionExpression="TotalSavings"
+            )
+            total += float(response.get('Item', {}).get('TotalSavings', {}).get('N', 0))
+        except dydb_client.exceptions.ResourceNotFoundException:
+            pass  # no legacy table, nothing to add
+    kwargs = {
+        'TableName': table_name,
+        'KeyConditionExpression': "AccountId = :account",
+        'ExpressionAttributeValues': {':account': {'S': str(account)}},
+        'ProjectionExpression': "TotalSavings"
+    }
+    while True:
+        response = dydb_client.query(**kwargs)
+        total += sum(float(item.get('TotalSavings', {}).get('N', 0)) for item in response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return total
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def migrate_tracker_to_shards(dydb_client, source_table=LEGACY_TRACKER_TABLE, target_table=SHARDED_TRACKER_TABLE):
+    """
+    Move every single-item VolumesSavingsTracker row into shard 0 of the sharded tracker
+    table. Rows are moved in a transaction that only deletes the source row if it did
+    not change in the meantime, so the migration can run alongside writers and be re-run.
+
+    :return: number of rows migrated
+    """
+    ensure_sharded_tracker_table(dydb_client, target_table)
+    migrated = 0
+    kwargs = {'TableName': source_table}
+    while True:
+        response = dydb_client.scan(**kwargs)
+        for item in response.get('Items', []):
+            total = item.get('TotalSavings', {'N': '0'})
+            try:
+                dydb_client.transact_write_items(TransactItems=[
+                    {'Update': {
+                        'TableName': target_table,
+                        'Key': {'AccountId': item['AccountId'], 'Shard': {'S': '0'}},
+                        'UpdateExpression': "ADD TotalSavings :savings",
+                        'ExpressionAttributeValues': {':savings': total}
+                    }},
+                    {'Delete': {
+                        'TableName': source_table,
+                        'Key': {'AccountId': item['AccountId']},
+                        'ConditionExpression': "TotalSavings = :savings",
+                        'ExpressionAttributeValues': {':savings': total}
+                    }}
+                ])
+                migrated += 1
+            except dydb_client.exceptions.TransactionCanceledException:
+                print(f"Tracker row {item['AccountId']['S']} changed during migration, run the migration again.")
+        if 'LastEvaluatedKey' not in response:
+            break
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    print(f"Migrated {migrated} tracker rows from {source_table} to {target_table}.")
+    return migrated
+
+
+if __name__ == "__main__":
+    from client_factory import get_client
+
+    parser = argparse.ArgumentParser(description="Move single-item savings rows into shard items (run before or "
+                                                 "right after setting SAVINGS_SHARDS > 1)")
+    parser.add_argument('--region', default='us-gov-west-1', help="region of the DynamoDB tables")
+    parser.add_argument('--savings-table', help="(Account, region) savings table to migrate, e.g. volumesavingtracker")
+    parser.add_argument('--region-attribute', default='Region', help="sort key of the savings table ('region' for "
+                                                                     "pricecheck_govcloud's table)")
+    parser.add_argument('--tracker', action='store_true',
+                        help="also move VolumesSavingsTracker rows into SHARDED_TRACKER_TABLE")
+    args = parser.parse_args()
+    if not args.savings_table and not args.tracker:
+        parser.error("nothing to migrate: pass --savings-table and/or --tracker")
+
+    client = get_client('dynamodb', args.region)
+    if args.savings_table:
+        migrate_savings_to_shards(client, args.savings_table, args.region_attribute)
+    if args.tracker:
+        migrate_tracker_to_shards(client)
@@ -0,0 +1,87 @@
+import json
+import os
+import subprocess
+import sys
+
+# Cold start: import of the module in a fresh interpreter (ms)
+COLD_START_BUDGET_MS = {
+    'offer_stream': 30,
+    'pricing_cache': 20,
+    'price_index': 20,
+    'pricing_api': 30,
+    'pricing_snapshot': 40,
+    'pricecheck_govcloud': 400,
+    'lambda_pricing_01': 400,
+}
+# Warm start: fetching the module's cached client again on the next invocation (ms)
+WARM_START_BUDGET_MS = 1
+
+# Runs inside the fresh interpreter; prints one JSON line with the measurements
+MEASURE_SNIPPET = """
+import importlib, json, sys, time
+name = sys.argv[1]
+start = time.perf_counter()
+module = importlib.import_module(name)
+cold_ms = (time.perf_counter() - start) * 1000
+result = {'module': name, 'cold_ms': cold_ms}
+getter = getattr(module, 'get_client', None)
+args = ('dynamodb', 'us-east-1')
+if getter is None:
+    getter, args = getattr(module, 'get_dydb_client', None), ()
+if getter is not None:
+    start = time.perf_counter()
+    getter(*args)
+    result['first_client_ms'] = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    getter(*args)
+    result['warm_ms'] = (time.perf_counter() - start) * 1000
+print(json.dumps(result))
+"""
+
+
+def measure_module(name):
+    """
+    Import name in a fresh interpreter and return its cold/warm start measurements.
+    """
+    env = dict(os.environ)
+    env.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    env.setdefault('function_name', 'startup_budget')
+    completed = subprocess.run(
+        [sys.executable, '-c', MEASURE_SNIPPET, name],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env, capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        error = completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else 'unknown error'
+        return {'module': name, 'error': error}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def check_budget(modules):
+    """
+    Measure every module and print it against its budget.
+
+    :return: True if every module that could be imported is within budget
+    """
+    within_budget = True
+    for name in modules:
+        result = measure_module(name)
+        if 'error' in result:
+            print(f"{name}: could not be measured ({result['error']})")
+            continue
+        budget = COLD_START_BUDGET_MS.get(name)
+        status = 'OK' if budget is None or result['cold_ms'] <= budget else 'OVER BUDGET'
+        within_budget = within_budget and status == 'OK'
+        line = f"{name}: cold import {result['cold_ms']:.1f} ms (budget {budget} ms) {status}"
+        if 'warm_ms' in result:
+            warm_ok = result['warm_ms'] <= WARM_START_BUDGET_MS
+            within_budget = within_budget and warm_ok
+            line += (f", first client {result['first_client_ms']:.1f} ms, warm client {result['warm_ms']:.3f} ms"
+                     f" (budget {WARM_START_BUDGET_MS} ms) {'OK' if warm_ok else 'OVER BUDGET'}")
+        print(line)
+    return within_budget
+
+
+if __name__ == "__main__":
+    # Usage: python startup_budget.py [module ...]
+    if not check_budget(sys.argv[1:] or list(COLD_START_BUDGET_MS)):
+        exit(1)
@@ -0,0 +1,241 @@
+import argparse
+import concurrent.futures
+import csv
+import glob
+import json
+import os
+import time
+
+from client_factory import get_client
+from rate_limiter import rate_limit_client
+from run_metrics import instrument_client
+from volume_pricing import OFFER_STATE_ID
+
+# Column order of the tables we export for finance; other tables use the attributes of a sample page
+EXPORT_COLUMNS = {
+    'VolumeCostSavings': ['VolumeId', 'AccountId', 'Region', 'CostSavings', 'TargetTerminationDate'],
+    'VolumePricing': ['VolumeId', 'AccountId', 'Sku', 'RegionCode', 'VolumeApiName', 'StorageMedia', 'Unit',
+                      'PricePerUnit', 'Location'],
+    'VolumesSavingsTracker': ['AccountId', 'TotalSavings'],
+}
+# Scan filters leaving bookkeeping items out of an export (the refresh's offer state items are not prices)
+EXPORT_FILTERS = {
+    'VolumePricing': {
+        'FilterExpression': "VolumeId <> :offer_state",
+        'ExpressionAttributeValues': {':offer_state': {'S': OFFER_STATE_ID}},
+    },
+}
+DEFAULT_SEGMENTS = 8
+DEFAULT_ROWS_PER_PART = 100000
+
+
+def attribute_value(value, parquet=False):
+    """
+    Convert one DynamoDB attribute value (client format) to a CSV or Parquet cell.
+    Numbers stay exact strings in CSV and become floats in Parquet.
+    """
+    if value is None or 'NULL' in value:
+        return None
+    if 'S' in value:
+        return value['S']
+    if 'N' in value:
+        return float(value['N']) if parquet else value['N']
+    if 'BOOL' in value:
+        return value['BOOL']
+    return json.dumps(value, sort_keys=True)
+
+
+def sample_columns(dynamo_client, table_name, columns=None):
+    """
+    Return [(column, type)] for an export, type being 'string', 'number' or 'bool'
+    as seen in the first page of the table. Unseen columns are strings.
+    """
+    items = dynamo_client.scan(TableName=table_name, Limit=100, **EXPORT_FILTERS.get(table_name, {})).get('Items', [])
+    types = {}
+    for item in items:
+        for name, value in item.items():
+            types.setdefault(name, 'number' if 'N' in value else 'bool' if 'BOOL' in value else 'string')
+    if columns is None:
+        columns = EXPORT_COLUMNS.get(table_name) or sorted(types)
+    return [(column, types.get(column, 'string')) for column in columns]
+
+
+def _segment_prefix(output_dir, segment):
+    return os.path.join(output_dir, f"segment-{segment:04d}")
+
+
+def _read_checkpoint(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_checkpoint(path, checkpoint):
+    # Written atomically, so a crash leaves either the old or the new checkpoint
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+class _PartWriter:
+    """
+    Writes the rows of one part file as CSV, or as Parquet with one row group per scan page.
+    """
+    def __init__(self, path, columns, fmt):
+        self.path = path
+        self.names = [name for name, _ in columns]
+        self.fmt = fmt
+        if fmt == 'parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            types = {'string': pa.string(), 'number': pa.float64(), 'bool': pa.bool_()}
+            self.schema = pa.schema([(name, types[kind]) for name, kind in columns])
+            self.writer = pq.ParquetWriter(f"{path}.tmp", self.schema)
+        else:
+            self.file = open(f"{path}.tmp", 'w', newline='', encoding='utf-8')
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(self.names)
+
+    def write_items(self, items):
+        parquet = self.fmt == 'parquet'
+        rows = [[attribute_value(item.get(name), parquet) for name in self.names] for item in items]
+        if parquet:
+            import pyarrow as pa
+            columns = list(zip(*rows)) if rows else [[] for _ in self.names]
+            self.writer.write_table(pa.Table.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(columns, self.schema)], schema=self.schema))
+        else:
+            self.writer.writerows(rows)
+
+    def close(self):
+        (self.writer if self.fmt == 'parquet' else self.file).close()
+        # A part only gets its final name once it is complete
+        os.replace(f"{self.path}.tmp", self.path)
+
+
+def export_segment(dynamo_client, table_name, segment, total_segments, output_dir, columns,
+                   fmt='csv', rows_per_part=DEFAULT_ROWS_PER_PART):
+    """
+    Scan one segment of a table into numbered part files, checkpointing the scan
+    position each time a part is completed. Re-running a failed segment resumes
+    after its last completed part.
+
+    :return: number of rows exported by this call
+    """
+    prefix = _segment_prefix(output_dir, segment)
+    checkpoint_path = f"{prefix}.checkpoint.json"
+    checkpoint = _read_checkpoint(checkpoint_path) or {'parts': 0, 'last_key': None, 'rows': 0, 'done': False}
+    if checkpoint['done']:
+        return 0
+    # Drop unfinished output of an interrupted run
+    for path in glob.glob(f"{prefix}-part-*.tmp"):
+        os.remove(path)
+
+    kwargs = {'TableName': table_name, 'Segment': segment, 'TotalSegments': total_segments,
+              **EXPORT_FILTERS.get(table_name, {})}
+    if checkpoint['last_key']:
+        kwargs['ExclusiveStartKey'] = checkpoint['last_key']
+
+    exported = 0
+    part = None
+    part_rows = 0
+    while True:
+        response = dynamo_client.scan(**kwargs)
+        items = response.get('Items', [])
+        if items:
+            if part is None:
+                part = _PartWriter(f"{prefix}-part-{checkpoint['parts']:05d}.{fmt}", columns, fmt)
+            part.write_items(items)
+            part_rows += len(items)
+        last_key = response.get('LastEvaluatedKey')
+
+        # Parts end on page boundaries, where the scan position is known
+        if part is not None and (part_rows >= rows_per_part or last_key is None):
+            part.close()
+            part = None
+            exported += part_rows
+            checkpoint = {'parts': checkpoint['parts'] + 1, 'last_key': last_key,
+                          'rows': checkpoint['rows'] + part_rows, 'done': last_key is None}
+            _write_checkpoint(checkpoint_path, checkpoint)
+            part_rows = 0
+        if last_key is None:
+            if not checkpoint['done']:
+                checkpoint['done'] = True
+                _write_checkpoint(checkpoint_path, checkpoint)
+            return exported
+        kwargs['ExclusiveStartKey'] = last_key
+
+
+def export_table(table_name, output_dir, fmt='csv', total_segments=DEFAULT_SEGMENTS, max_workers=None,
+                 columns=None, rows_per_part=DEFAULT_ROWS_PER_PART, dynamo_client=None, region_name=None):
+    """
+    Export a DynamoDB table to CSV or Parquet part files with a parallel scan:
+    every worker scans its own segments and streams pages straight to disk, so the
+    table is never held in memory. Re-running an export resumes unfinished segments.
+
+    :param output_dir: directory for the part files and segment checkpoints
+    :param fmt: 'csv' or 'parquet' (needs pyarrow)
+    :param total_segments: number of scan segments; must stay the same when resuming
+    :param max_workers: concurrent segment scans, defaults to total_segments
+    :param columns: exported attributes, see EXPORT_COLUMNS
+    :return: dict with rows exported, failed segments and elapsed seconds
+    """
+    max_workers = max_workers or total_segments
+    if dynamo_client is None:
+        dynamo_client = get_client('dynamodb', region_name, max_workers=max_workers)
+    dynamo_client = rate_limit_client(instrument_client(dynamo_client))
+
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, 'export.json')
+    manifest = _read_checkpoint(manifest_path)
+    if manifest is None:
+        manifest = {'table': table_name, 'format': fmt, 'total_segments': total_segments,
+                    'columns': sample_columns(dynamo_client, table_name, columns)}
+        _write_checkpoint(manifest_path, manifest)
+    elif (manifest['table'], manifest['format'], manifest['total_segments']) != (table_name, fmt, total_segments):
+        raise ValueError(f"{output_dir} holds an export of {manifest['table']} as {manifest['format']} "
+                         f"in {manifest['total_segments']} segments; use another output directory")
+
+    start = time.perf_counter()
+    rows = 0
+    failed = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(export_segment, dynamo_client, table_name, segment, total_segments, output_dir,
+                            manifest['columns'], fmt, rows_per_part): segment
+            for segment in range(total_segments)
+        }
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                rows += future.result()
+            except Exception as e:
+                print(f"Error exporting segment {futures[future]} of {table_name}: {e}")
+                failed.append(futures[future])
+
+    seconds = time.perf_counter() - start
+    print(f"Exported {rows} rows of {table_name} to {output_dir} in {seconds:.1f}s"
+          + (f", segments {sorted(failed)} failed; run the export again to resume them." if failed else "."))
+    return {'rows': rows, 'failed_segments': sorted(failed), 'seconds': seconds}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export savings tables to CSV or Parquet with a parallel scan")
+    parser.add_argument('tables', nargs='+', help="tables to export, e.g. VolumeCostSavings VolumePricing")
+    parser.add_argument('--output-dir', default='export', help="one sub-directory per table is created here")
+    parser.add_argument('--format', choices=('csv', 'parquet'), default='csv')
+    parser.add_argument('--segments', type=int, default=DEFAULT_SEGMENTS, help="parallel scan segments per table")
+    parser.add_argument('--workers', type=int, default=None, help="concurrent segment scans (default: --segments)")
+    parser.add_argument('--rows-per-part', type=int, default=DEFAULT_ROWS_PER_PART)
+    parser.add_argument('--region', default=None)
+    args = parser.parse_args()
+
+    failed_tables = []
+    for table in args.tables:
+        result = export_table(table, os.path.join(args.output_dir, table), args.format, args.segments, args.workers,
+                              rows_per_part=args.rows_per_part, region_name=args.region)
+        if result['failed_segments']:
+            failed_tables.append(table)
+    exit(1 if failed_tables else 0)
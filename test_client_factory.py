@@ -0,0 +1,30 @@
+import os
+
+import pytest
+
+moto = pytest.importorskip('moto')
+
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+
+import client_factory
+
+
+def test_low_level_client_still_works_after_resource_call():
+    region = 'us-gov-west-1'
+    with moto.mock_aws():
+        client = client_factory.get_client('dynamodb', region)
+        client.create_table(
+            TableName='X',
+            KeySchema=[{'AttributeName': 'VolumeId', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': 'VolumeId', 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        client.put_item(TableName='X', Item={'VolumeId': {'S': 'v'}})
+
+        table = client_factory.get_resource('dynamodb', region).Table('X')
+        assert table.get_item(Key={'VolumeId': 'v'})['Item'] == {'VolumeId': 'v'}
+
+        assert client_factory.get_resource('dynamodb', region).meta.client is not client
+        item = client.get_item(TableName='X', Key={'VolumeId': {'S': 'v'}})['Item']
+        assert item == {'VolumeId': {'S': 'v'}}
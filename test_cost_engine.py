@@ -0,0 +1,68 @@
+import functools
+import random
+
+import numpy as np
+import pytest
+
+from cost_engine import inventory_monthly_costs, volume_monthly_cost
+from price_index import build_price_index_from_price_list, lookup_price
+
+REGIONS = ('us-east-1', 'us-gov-west-1', 'eu-west-1')
+VOLUME_TYPES = ('gp2', 'gp3', 'io1', 'io2', 'st1')
+UNITS = ('GB-Mo', 'IOPS-Mo', 'GiBps-mo')
+
+
+def random_prices(rng):
+    # Some prices are missing, including the storage price of whole (region, type) pairs
+    prices = {}
+    for region in REGIONS:
+        for volume_type in VOLUME_TYPES:
+            for unit in UNITS:
+                if rng.random() < 0.85:
+                    prices[(region, volume_type, unit)] = round(rng.uniform(0.01, 0.2), 4)
+    return prices
+
+
+def random_row(rng, i):
+    volume_type = rng.choice(VOLUME_TYPES)
+    # io2 IOPS cross the 32000 and 64000 tier bounds; gp3 values straddle the free allowances
+    iops = rng.choice([0, 2999, 3000, 3001, rng.randrange(0, 100000)])
+    throughput = rng.choice([0, 125, 126, rng.randrange(0, 1000)])
+    row = [f'vol-{i}', f'vol-{i}', '111', rng.choice(REGIONS), rng.randrange(1, 16384), volume_type,
+           '2026-01-01', '2026-12-01', False, iops, throughput]
+    # Rows without the IOPS / throughput columns count them as 0
+    return row[:rng.choice([9, 10, 11])]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_vectorized_costs_match_scalar(seed):
+    rng = random.Random(seed)
+    prices = random_prices(rng)
+    price_of = lambda region, volume_type, unit: prices.get((region, volume_type, unit))
+    rows = [random_row(rng, i) for i in range(2000)]
+
+    costs = inventory_monthly_costs(rows, price_of)
+    for row, cost in zip(rows, costs):
+        iops = row[9] if len(row) > 9 else 0
+        throughput = row[10] if len(row) > 10 else 0
+        expected = volume_monthly_cost(price_of, row[3], row[5], row[4], iops, throughput)
+        if expected is None:
+            assert np.isnan(cost)
+        else:
+            assert cost == pytest.approx(expected, rel=1e-9)
+
+
+def iops_product(tier, price):
+    suffix = '' if tier == 1 else f'.tier{tier}'
+    return {
+        'product': {'attributes': {'regionCode': 'us-east-1', 'volumeApiName': 'io2',
+                                   'usagetype': f'EBS:VolumeP-IOPS.io2{suffix}', 'group': f'EBS IOPS Tier {tier}'}},
+        'terms': {'OnDemand': {'t': {'priceDimensions': {'d': {'unit': 'IOPS-Mo', 'pricePerUnit': {'USD': str(price)}}}}}}
+    }
+
+
+def test_price_index_keeps_the_first_iops_tier():
+    # Upper tiers listed first must not become the io2 IOPS price
+    index = build_price_index_from_price_list([iops_product(3, 0.032), iops_product(2, 0.045), iops_product(1, 0.065)])
+    price_of = functools.partial(lookup_price, index)
+    assert price_of('us-east-1', 'io2', 'IOPS-Mo') == 0.065
@@ -0,0 +1,60 @@
+import json
+import os
+from types import SimpleNamespace
+
+import pytest
+
+moto = pytest.importorskip('moto')
+
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+os.environ.setdefault('function_name', 'test')
+
+import boto3
+
+import dynamo_batch
+import lambda_pricing_01
+import rate_limiter
+from savings_rollups import get_rollup
+
+REGION = 'us-east-1'
+
+
+def row(volume_id, size, target_date='2026-12-01'):
+    # [name, id, account, region, size, type, create_time, target_date, excluded]
+    return ['name', volume_id, '111', REGION, size, 'gp2', '2026-01-01', target_date, False]
+
+
+def fail_marked_items(table_name, writer):
+    # Leave items with TargetTerminationDate 'fail' unprocessed and write the others
+    def before_call(params, **kwargs):
+        requests = json.loads(params['body'])['RequestItems'][table_name]
+        failed = [r for r in requests if r['PutRequest']['Item']['TargetTerminationDate']['S'] == 'fail']
+        written = [r for r in requests if r not in failed]
+        if written:
+            writer.batch_write_item(RequestItems={table_name: written})
+        return SimpleNamespace(status_code=200, headers={}), {'UnprocessedItems': {table_name: failed} if failed else {}}
+    return before_call
+
+
+def test_unprocessed_item_is_not_booked(monkeypatch):
+    monkeypatch.setattr(lambda_pricing_01, 'get_volume_price', lambda *args, **kwargs: 0.1)
+    # The injected failures are not throttles; keep retries and pacing out of the test
+    monkeypatch.setattr(dynamo_batch.time, 'sleep', lambda seconds: None)
+    monkeypatch.setattr(rate_limiter.TokenBucket, 'on_throttle', lambda self: None)
+    with moto.mock_aws():
+        dynamo_client = boto3.client('dynamodb', region_name=REGION)
+        writer = boto3.client('dynamodb', region_name=REGION)
+        dynamo_client.meta.events.register('before-call.dynamodb.BatchWriteItem',
+                                           fail_marked_items('Savings', writer))
+
+        data = [row('vol-x', 100, 'fail')] + [row(f'vol-{i}', 10) for i in range(30)] + [row('vol-x', 50)]
+        result = lambda_pricing_01.calculate_and_upload_cost_savings(
+            data, dynamo_client=dynamo_client, table_name='Savings', max_workers=1, chunk_size=1,
+            rollup_table='Rollups')
+        assert result['unprocessed'] == 1
+
+        items = writer.scan(TableName='Savings')['Items']
+        volumes, savings = get_rollup(writer, '111', table_name='Rollups')
+        assert volumes == len(items) == 31
+        assert savings == pytest.approx(sum(float(item['CostSavings']['N']) for item in items))
@@ -0,0 +1,101 @@
+import os
+
+import pytest
+
+moto = pytest.importorskip('moto')
+
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+
+import pricecheck_dyno
+from savings_ledger import ensure_ledger_table
+from sharded_savings import ensure_sharded_tracker_table, get_tracker_savings, migrate_tracker_to_shards
+
+REGION = 'us-gov-west-1'
+
+
+def create_tracker_table(client):
+    client.create_table(
+        TableName='VolumesSavingsTracker',
+        KeySchema=[{'AttributeName': 'AccountId', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[{'AttributeName': 'AccountId', 'AttributeType': 'S'}],
+        BillingMode='PAY_PER_REQUEST'
+    )
+
+
+@pytest.mark.parametrize('shards', [1, 4])
+def test_replayed_volume_changes_nothing(monkeypatch, shards):
+    monkeypatch.setattr(pricecheck_dyno, 'SAVINGS_SHARDS', shards)
+    monkeypatch.setattr(pricecheck_dyno, 'get_average_volume_cost', lambda region: 0.1)
+    with moto.mock_aws():
+        client = pricecheck_dyno.get_client('dynamodb', REGION)
+        ensure_ledger_table(client)
+        create_tracker_table(client)
+        ensure_sharded_tracker_table(client)
+
+        assert float(pricecheck_dyno.track_volume_savings('111', 100, REGION, volume_id='vol-1')) == pytest.approx(10.0)
+        assert pricecheck_dyno.track_volume_savings('111', 100, REGION, volume_id='vol-1') == 0
+        assert float(pricecheck_dyno.track_volume_savings('111', 50, REGION, volume_id='vol-2')) == pytest.approx(5.0)
+
+        if shards > 1:
+            assert get_tracker_savings(client, '111') == pytest.approx(15.0)
+        else:
+            item = client.get_item(TableName='VolumesSavingsTracker', Key={'AccountId': {'S': '111'}})['Item']
+            assert float(item['TotalSavings']['N']) == pytest.approx(15.0)
+
+
+def test_sharded_tracker_without_volume_id(monkeypatch):
+    monkeypatch.setattr(pricecheck_dyno, 'SAVINGS_SHARDS', 4)
+    monkeypatch.setattr(pricecheck_dyno, 'get_average_volume_cost', lambda region: 0.1)
+    with moto.mock_aws():
+        client = pricecheck_dyno.get_client('dynamodb', REGION)
+        ensure_sharded_tracker_table(client)
+
+        pricecheck_dyno.track_volume_savings('111', 100, REGION)
+        pricecheck_dyno.track_volume_savings('111', 100, REGION)
+        assert get_tracker_savings(client, '111') == pytest.approx(20.0)
+
+
+def test_sharded_tracker_reads_legacy_rows(monkeypatch):
+    monkeypatch.setattr(pricecheck_dyno, 'SAVINGS_SHARDS', 4)
+    monkeypatch.setattr(pricecheck_dyno, 'get_average_volume_cost', lambda region: 0.1)
+    with moto.mock_aws():
+        client = pricecheck_dyno.get_client('dynamodb', REGION)
+        create_tracker_table(client)
+        client.put_item(TableName='VolumesSavingsTracker',
+                        Item={'AccountId': {'S': '111'}, 'TotalSavings': {'N': '7'}})
+        ensure_sharded_tracker_table(client)
+
+        pricecheck_dyno.track_volume_savings('111', 100, REGION)
+        assert get_tracker_savings(client, '111') == pytest.approx(17.0)
+
+        migrate_tracker_to_shards(client)
+        assert get_tracker_savings(client, '111') == pytest.approx(17.0)
+
+
+def fake_products(pricing_client, filters, ttl=None):
+    values = {f['Field']: f['Value'] for f in filters}
+    for i in range(2):
+        yield {
+            'product': {
+                'sku': f"{values['volumeApiName']}-{values['regionCode']}-{i}",
+                'attributes': {'volumeApiName': values['volumeApiName'], 'storageMedia': 'SSD-backed',
+                               'location': 'AWS GovCloud (US-West)', 'regionCode': values['regionCode']}
+            },
+            'terms': {'OnDemand': {'t': {'priceDimensions': {'d': {'unit': 'GB-Mo', 'pricePerUnit': {'USD': '0.1'}}}}}}
+        }
+
+
+def test_offer_state_is_kept_per_filters(monkeypatch):
+    monkeypatch.setattr(pricecheck_dyno, 'get_offer_versions', lambda: {REGION: 'v1'})
+    monkeypatch.setattr(pricecheck_dyno, 'iter_products_cached', fake_products)
+    with moto.mock_aws():
+        client = pricecheck_dyno.get_client('dynamodb', REGION)
+        gp2 = pricecheck_dyno.pricing_filters(volume_type='gp2')
+        gp3 = pricecheck_dyno.pricing_filters(volume_type='gp3')
+        refresh = pricecheck_dyno.refresh_govcloud_pricing_info
+
+        assert refresh(None, client, 'VolumePricing', gp2, regions=[REGION]) == 2
+        assert refresh(None, client, 'VolumePricing', gp3, regions=[REGION]) == 2
+        assert refresh(None, client, 'VolumePricing', gp2, regions=[REGION]) == 0
+        assert refresh(None, client, 'VolumePricing', gp3, regions=[REGION]) == 0
@@ -0,0 +1,34 @@
+import sqlite3
+import time
+
+import pytest
+
+import pricing_snapshot
+
+
+def write_snapshot(path, built_at):
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE prices (region TEXT, volume_api_name TEXT, unit TEXT, price REAL,
+                             PRIMARY KEY (region, volume_api_name, unit)) WITHOUT ROWID;
+        CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID;
+    """)
+    conn.execute("INSERT INTO prices VALUES ('us-gov-west-1', 'gp2', 'GB-Mo', 0.12)")
+    conn.execute("INSERT INTO meta VALUES ('built_at', ?)", (str(int(built_at)),))
+    conn.commit()
+    conn.close()
+
+
+@pytest.mark.parametrize('age_days, used', [(1, True), (400, False)])
+def test_stale_snapshot_is_not_used(tmp_path, monkeypatch, age_days, used):
+    path = str(tmp_path / 'pricing_snapshot.db')
+    write_snapshot(path, time.time() - age_days * 24 * 60 * 60)
+    monkeypatch.setattr(pricing_snapshot, 'PRICING_SNAPSHOT_PATH', path)
+    monkeypatch.setattr(pricing_snapshot, '_snapshot', None)
+    monkeypatch.setattr(pricing_snapshot, '_snapshot_checked', False)
+
+    snapshot = pricing_snapshot.get_pricing_snapshot()
+    if used:
+        assert pricing_snapshot.snapshot_price(snapshot, 'us-gov-west-1', 'gp2') == 0.12
+    else:
+        assert snapshot is None
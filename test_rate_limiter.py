@@ -0,0 +1,29 @@
+import pytest
+
+import rate_limiter
+from rate_limiter import MAX_RATE, RATE_STEP, TokenBucket
+
+
+def test_rate_only_grows_while_callers_wait():
+    bucket = TokenBucket(200.0, 5)
+    for _ in range(50):
+        bucket.acquire()  # the first five are served from the burst, the rest wait
+        bucket.on_success()
+    assert 200.0 < bucket.rate <= 200.0 + RATE_STEP * 45 + 1e-9
+    assert bucket.rate < MAX_RATE
+
+    idle = TokenBucket(5.0, 5)
+    for _ in range(200):
+        idle.on_success()  # nobody waited for tokens
+    assert idle.rate == 5.0
+
+
+def test_failed_call_is_not_a_success():
+    bucket = TokenBucket(5.0, 5)
+    bucket.waited = True
+    context = {'rate_limit': (bucket, 1)}
+    rate_limiter._after_call(parsed={'Error': {'Code': 'ThrottlingException'}}, context=context)
+    assert bucket.rate == 5.0
+
+    rate_limiter._after_call(parsed={'ResponseMetadata': {}}, context=context)
+    assert bucket.rate == pytest.approx(5.0 + RATE_STEP)
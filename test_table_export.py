@@ -0,0 +1,32 @@
+import csv
+import glob
+import os
+
+import pytest
+
+moto = pytest.importorskip('moto')
+
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+
+import pricecheck_dyno
+import table_export
+
+REGION = 'us-gov-west-1'
+
+
+def test_volume_pricing_export_skips_offer_state(tmp_path):
+    with moto.mock_aws():
+        client = pricecheck_dyno.get_client('dynamodb', REGION)
+        pricecheck_dyno.ensure_table_exists(client, 'VolumePricing')
+        pricecheck_dyno.store_or_update_in_dynamodb(client, 'VolumePricing', 'SKU1', f'{REGION}#gp2#GB-Mo', 'gp2', 'SSD-backed',
+                                                    '0.12', 'AWS GovCloud (US-West)', 'SKU1', REGION, 'GB-Mo')
+        pricecheck_dyno.put_offer_state(client, 'VolumePricing', REGION, 'v1', {'SKU1': '0.12'})
+
+        result = table_export.export_table('VolumePricing', str(tmp_path), total_segments=2, dynamo_client=client)
+
+    rows = [row for path in sorted(glob.glob(str(tmp_path / '*.csv'))) for row in csv.DictReader(open(path))]
+    assert result['rows'] == 1
+    assert rows == [{'VolumeId': 'SKU1', 'AccountId': f'{REGION}#gp2#GB-Mo', 'Sku': 'SKU1', 'RegionCode': REGION,
+                     'VolumeApiName': 'gp2', 'StorageMedia': 'SSD-backed', 'Unit': 'GB-Mo', 'PricePerUnit': '0.12',
+                     'Location': 'AWS GovCloud (US-West)'}]
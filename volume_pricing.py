@@ -0,0 +1,102 @@
+import argparse
+
+from client_factory import get_client
+from price_index import LOCATION_REGION_CODES
+
+OFFER_STATE_ID = 'OfferState'
+
+
+def pricing_item_key(sku, region, volume_api_name, unit):
+    """
+    Stable VolumePricing key of one price: VolumeId holds the SKU and AccountId
+    '<region code>#<volumeApiName>#<unit>', so storing the same price again
+    updates the existing item instead of adding a row.
+
+    :return: (VolumeId, AccountId)
+    """
+    return sku, f"{region}#{volume_api_name}#{unit}"
+
+
+def _item_group(item):
+    """
+    Return (region code, volume API name, storage media) of a price row.
+    """
+    location = item.get('Location', {}).get('S', 'N/A')
+    region = item.get('RegionCode', {}).get('S') or LOCATION_REGION_CODES.get(location, location)
+    return region, item.get('VolumeApiName', {}).get('S'), item.get('StorageMedia', {}).get('S')
+
+
+def _legacy_timestamp(item):
+    # Legacy rows are keyed '<milliseconds>-<random>', see the old generate_timestamp_based_id
+    try:
+        return int(item['VolumeId']['S'].split('-')[0])
+    except ValueError:
+        return 0
+
+
+def compact_volume_pricing(dynamodb_client, table_name='VolumePricing', dry_run=False):
+    """
+    One-time compaction of the rows written with random timestamp keys.
+
+    Legacy rows (no Sku attribute) of a (region, volume API name, storage media) that
+    already has SKU-keyed rows are deleted. Of the other legacy groups only the newest
+    row is kept, and the offer state of their regions is cleared so the next
+    refresh_govcloud_pricing_info stores every SKU of those regions under its stable key;
+    running the compaction again after that refresh removes the remaining legacy rows.
+
+    :return: dict with rows scanned, rows deleted and regions whose offer state was cleared
+    """
+    legacy, stable_groups, offer_states = {}, set(), []
+    scanned = 0
+    kwargs = {'TableName': table_name}
+    while True:
+        response = dynamodb_client.scan(**kwargs)
+        for item in response.get('Items', []):
+            scanned += 1
+            if item['VolumeId']['S'] == OFFER_STATE_ID:
+                offer_states.append(item)
+                continue
+            if 'Sku' in item:
+                stable_groups.add(_item_group(item))
+            else:
+                legacy.setdefault(_item_group(item), []).append(item)
+        if 'LastEvaluatedKey' not in response:
+            break
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    to_delete, stale_regions = [], set()
+    for group, items in legacy.items():
+        if group in stable_groups:
+            to_delete.extend(items)
+        else:
+            items.sort(key=_legacy_timestamp)
+            to_delete.extend(items[:-1])
+            stale_regions.add(group[0])
+
+    if not dry_run:
+        for item in to_delete:
+            dynamodb_client.delete_item(TableName=table_name,
+                                        Key={'VolumeId': item['VolumeId'], 'AccountId': item['AccountId']})
+        # Offer states are keyed '<region>' or '<region>#<filters hash>'
+        for item in offer_states:
+            if item['AccountId']['S'].split('#')[0] in stale_regions:
+                dynamodb_client.delete_item(TableName=table_name,
+                                            Key={'VolumeId': item['VolumeId'], 'AccountId': item['AccountId']})
+
+    action = "Would delete" if dry_run else "Deleted"
+    print(f"Scanned {scanned} rows of {table_name}. {action} {len(to_delete)} duplicate rows.")
+    if stale_regions:
+        print(f"{'Would clear' if dry_run else 'Cleared'} the offer state of {', '.join(sorted(stale_regions))}; "
+              f"run the pricing refresh and then this compaction again.")
+    return {'scanned': scanned, 'deleted': len(to_delete), 'stale_regions': sorted(stale_regions)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Collapse duplicate VolumePricing rows left by timestamp-keyed writes")
+    parser.add_argument('--table', default='VolumePricing')
+    parser.add_argument('--region', default='us-gov-west-1')
+    parser.add_argument('--dry-run', action='store_true', help="only report what would be deleted")
+    args = parser.parse_args()
+
+    client = get_client('dynamodb', args.region)
+    compact_volume_pricing(client, args.table, args.dry_run)